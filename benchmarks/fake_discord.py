@@ -0,0 +1,459 @@
+import asyncio
+import contextlib
+import itertools
+import json
+import time
+import uuid
+from collections import Counter
+from typing import Any, NamedTuple
+
+from aiohttp import WSMsgType, web
+from discord import Permissions
+from discord.utils import time_snowflake, utcnow
+
+
+class FakeGuild(NamedTuple):
+    id: int
+    text_channel_id: int
+    voice_channel_id: int
+    user: Any
+    lounge_channel_id: int
+    # Sitting in the lounge from the start, never near the bot
+    idle_users: list[Any]
+
+
+class FakeDiscord:
+    """The Discord REST API and gateway, as far as the bot uses them.
+
+    Interactions and voice state changes are dispatched over the gateway like
+    real Discord would, and the bot's replies are timed as they arrive.
+    """
+
+    def __init__(
+        self,
+        *,
+        guilds: int,
+        owner_id: int,
+        idle_members: int = 0,
+        rest_latency: float = 0.02,
+        voice_latency: float = 0,
+    ):
+        self.rest_latency = rest_latency
+        self.voice_latency = voice_latency
+        self.idle_members = idle_members
+
+        self._ids = itertools.count(1)
+        self.application_id = self.snowflake()
+        self.bot_user = self.user("Benchmark Bot", bot=True)
+        self.owner = self.user("Owner", user_id=owner_id)
+        self.guilds = [self.guild(i) for i in range(guilds)]
+        self._guilds = {str(guild.id): guild for guild in self.guilds}
+
+        self.requests: Counter[str] = Counter()
+        self.replies: Counter[str] = Counter()
+        self.errors_reported = 0
+        self.voice_joins = 0
+        self.port = 0
+        self._sequence = itertools.count(1)
+        self._ws: web.WebSocketResponse | None = None
+        self._pending: dict[str, tuple[float, asyncio.Future[tuple[float, str]]]] = {}
+        self._runner: web.AppRunner | None = None
+        self._voice_tasks: set[asyncio.Task[None]] = set()
+
+    def snowflake(self) -> int:
+        # Real timestamps, so interaction.created_at is meaningful
+        return time_snowflake(utcnow()) + next(self._ids) % 4096
+
+    def user(self, name: str, *, bot: bool = False, user_id: int | None = None) -> Any:
+        return {
+            "id": str(user_id or self.snowflake()),
+            "username": name,
+            "discriminator": "0",
+            "global_name": name,
+            "avatar": None,
+            "bot": bot,
+        }
+
+    def guild(self, i: int) -> FakeGuild:
+        return FakeGuild(
+            self.snowflake(),
+            self.snowflake(),
+            self.snowflake(),
+            self.user(f"Listener {i}"),
+            self.snowflake(),
+            [self.user(f"Idle {i}.{j}") for j in range(self.idle_members)],
+        )
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/gateway", self._gateway)
+        api = "/api/v10"
+        app.router.add_get(f"{api}/users/@me", self._get_me)
+        app.router.add_get(f"{api}/users/{{user}}", self._get_user)
+        app.router.add_post(f"{api}/users/@me/channels", self._create_dm)
+        app.router.add_get(f"{api}/oauth2/applications/@me", self._application)
+        app.router.add_put(f"{api}/applications/{{app}}/commands", self._sync)
+        app.router.add_put(
+            f"{api}/applications/{{app}}/guilds/{{guild}}/commands", self._sync
+        )
+        app.router.add_post(
+            f"{api}/interactions/{{id}}/{{token}}/callback", self._callback
+        )
+        app.router.add_post(f"{api}/webhooks/{{app}}/{{token}}", self._followup)
+        app.router.add_post(f"{api}/channels/{{channel}}/messages", self._message)
+        app.router.add_patch(
+            f"{api}/channels/{{channel}}/messages/{{message}}", self._message
+        )
+        app.router.add_delete(
+            f"{api}/channels/{{channel}}/messages/{{message}}", self._no_content
+        )
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        for task in self._voice_tasks:
+            task.cancel()
+        if self._ws:
+            await self._ws.close()
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def dispatch(self, event: str, data: Any) -> None:
+        assert self._ws is not None
+        await self._send({"op": 0, "t": event, "s": next(self._sequence), "d": data})
+
+    async def join_voice(self, guild: FakeGuild) -> None:
+        await self.dispatch(
+            "VOICE_STATE_UPDATE",
+            self._voice_state(guild, guild.user, str(guild.voice_channel_id)),
+        )
+
+    async def leave_voice(self, guild: FakeGuild) -> None:
+        await self.dispatch(
+            "VOICE_STATE_UPDATE", self._voice_state(guild, guild.user, None)
+        )
+
+    async def command(
+        self, guild: FakeGuild, name: str, *, focused: str | None = None, **options: str
+    ) -> tuple[float, str]:
+        token = uuid.uuid4().hex
+        future: asyncio.Future[tuple[float, str]]
+        future = asyncio.get_running_loop().create_future()
+        self._pending[token] = (time.perf_counter(), future)
+        await self.dispatch(
+            "INTERACTION_CREATE",
+            {
+                "id": str(self.snowflake()),
+                "application_id": str(self.application_id),
+                # Autocomplete requests only differ in type and the focused option
+                "type": 2 if focused is None else 4,
+                "token": token,
+                "version": 1,
+                "guild_id": str(guild.id),
+                "channel_id": str(guild.text_channel_id),
+                "channel": self._text_channel(guild),
+                "member": self._member(guild.user),
+                "app_permissions": str(Permissions.all().value),
+                "locale": "en-US",
+                "guild_locale": "en-US",
+                "entitlements": [],
+                "authorizing_integration_owners": {"0": str(guild.id)},
+                "context": 0,
+                "data": {
+                    "id": str(self.snowflake()),
+                    "name": name,
+                    "type": 1,
+                    "options": [
+                        {"name": key, "type": 3, "value": value}
+                        | ({"focused": True} if key == focused else {})
+                        for key, value in options.items()
+                    ],
+                },
+            },
+        )
+        try:
+            return await future
+        finally:
+            self._pending.pop(token, None)
+
+    async def _send(self, payload: Any) -> None:
+        assert self._ws is not None
+        await self._ws.send_str(json.dumps(payload))
+
+    def _complete(self, token: str, message: Any) -> None:
+        embeds = message.get("embeds") or [{}]
+        reply = message.get("content") or embeds[0].get("title", "")
+        self.replies[reply] += 1
+        pending = self._pending.get(token)
+        if pending and not pending[1].done():
+            pending[1].set_result((time.perf_counter() - pending[0], reply))
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler: Any) -> Any:
+        if request.path != "/gateway":
+            self.requests[request.method] += 1
+            if self.rest_latency:
+                await asyncio.sleep(self.rest_latency)
+        return await handler(request)
+
+    async def _gateway(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        self._ws = ws
+        await self._send({"op": 10, "d": {"heartbeat_interval": 41_250}})
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                break
+            payload = json.loads(message.data)
+            match payload["op"]:
+                case 1:
+                    await self._send({"op": 11})
+                case 2:
+                    await self._identify(payload["d"].get("shard", [0, 1]))
+                case 4:
+                    # Discord takes a while to pick a voice server, without
+                    # holding up the rest of the gateway
+                    task = asyncio.create_task(self._bot_voice_state(payload["d"]))
+                    self._voice_tasks.add(task)
+                    task.add_done_callback(self._voice_tasks.discard)
+        return ws
+
+    async def _identify(self, shard: list[int]) -> None:
+        await self.dispatch(
+            "READY",
+            {
+                "v": 10,
+                "user": self.bot_user,
+                "guilds": [
+                    {"id": str(guild.id), "unavailable": True} for guild in self.guilds
+                ],
+                "session_id": uuid.uuid4().hex,
+                "shard": shard,
+                "resume_gateway_url": f"ws://127.0.0.1:{self.port}/gateway",
+                "application": {"id": str(self.application_id), "flags": 0},
+            },
+        )
+        for guild in self.guilds:
+            await self.dispatch("GUILD_CREATE", self._guild_create(guild))
+
+    async def _bot_voice_state(self, data: Any) -> None:
+        guild = self._guilds[str(data["guild_id"])]
+        channel_id = data["channel_id"]
+        # The bot hangs up while its players leave voice on shutdown
+        with contextlib.suppress(ConnectionResetError):
+            await self.dispatch(
+                "VOICE_STATE_UPDATE",
+                self._voice_state(guild, self.bot_user, channel_id),
+            )
+            if channel_id:
+                self.voice_joins += 1
+                await asyncio.sleep(self.voice_latency)
+                await self.dispatch(
+                    "VOICE_SERVER_UPDATE",
+                    {
+                        "token": uuid.uuid4().hex,
+                        "guild_id": str(guild.id),
+                        "endpoint": "voice.benchmark.invalid:443",
+                    },
+                )
+
+    def _member(self, user: Any) -> Any:
+        return {
+            "user": user,
+            "roles": [],
+            "joined_at": utcnow().isoformat(),
+            "deaf": False,
+            "mute": False,
+            "flags": 0,
+            "permissions": str(Permissions.all().value),
+        }
+
+    def _voice_state(self, guild: FakeGuild, user: Any, channel_id: str | None) -> Any:
+        return {
+            "guild_id": str(guild.id),
+            "channel_id": channel_id,
+            "user_id": user["id"],
+            "member": self._member(user),
+            "session_id": uuid.uuid4().hex,
+            "deaf": False,
+            "mute": False,
+            "self_deaf": user is self.bot_user,
+            "self_mute": False,
+            "self_video": False,
+            "suppress": False,
+            "request_to_speak_timestamp": None,
+        }
+
+    def _text_channel(self, guild: FakeGuild) -> Any:
+        return {
+            "id": str(guild.text_channel_id),
+            "guild_id": str(guild.id),
+            "type": 0,
+            "name": "general",
+            "position": 0,
+            "permission_overwrites": [],
+            "nsfw": False,
+            "parent_id": None,
+        }
+
+    def _guild_create(self, guild: FakeGuild) -> Any:
+        return {
+            "id": str(guild.id),
+            "name": f"Guild {guild.id}",
+            "icon": None,
+            "owner_id": self.owner["id"],
+            "features": [],
+            "member_count": 2 + len(guild.idle_users),
+            "large": False,
+            "roles": [
+                {
+                    "id": str(guild.id),
+                    "name": "@everyone",
+                    "permissions": str(Permissions.all().value),
+                    "position": 0,
+                    "color": 0,
+                    "hoist": False,
+                    "managed": False,
+                    "mentionable": False,
+                    "flags": 0,
+                }
+            ],
+            "channels": [
+                self._text_channel(guild),
+                {
+                    "id": str(guild.voice_channel_id),
+                    "type": 2,
+                    "name": "voice",
+                    "position": 1,
+                    "permission_overwrites": [],
+                    "bitrate": 64_000,
+                    "user_limit": 0,
+                    "rtc_region": None,
+                    "parent_id": None,
+                },
+                {
+                    "id": str(guild.lounge_channel_id),
+                    "type": 2,
+                    "name": "lounge",
+                    "position": 2,
+                    "permission_overwrites": [],
+                    "bitrate": 64_000,
+                    "user_limit": 0,
+                    "rtc_region": None,
+                    "parent_id": None,
+                },
+            ],
+            "members": [
+                self._member(user) for user in (self.bot_user, *guild.idle_users)
+            ],
+            "voice_states": [
+                self._voice_state(guild, user, str(guild.lounge_channel_id))
+                for user in guild.idle_users
+            ],
+            "threads": [],
+            "emojis": [],
+            "stickers": [],
+            "stage_instances": [],
+            "guild_scheduled_events": [],
+            "soundboard_sounds": [],
+        }
+
+    def _message_payload(self, request: web.Request) -> Any:
+        return {
+            "id": request.match_info.get("message") or str(self.snowflake()),
+            "channel_id": request.match_info.get("channel", "0"),
+            "author": self.bot_user,
+            "content": "",
+            "timestamp": utcnow().isoformat(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "pinned": False,
+            "type": 0,
+            "flags": 0,
+            "components": [],
+        }
+
+    async def _get_me(self, request: web.Request) -> web.Response:  # noqa: ARG002
+        return _json(self.bot_user)
+
+    async def _get_user(self, request: web.Request) -> web.Response:  # noqa: ARG002
+        return _json(self.owner)
+
+    async def _create_dm(self, request: web.Request) -> web.Response:  # noqa: ARG002
+        return _json(
+            {"id": str(self.snowflake()), "type": 1, "recipients": [self.owner]}
+        )
+
+    async def _application(self, request: web.Request) -> web.Response:  # noqa: ARG002
+        return _json(
+            {
+                "id": str(self.application_id),
+                "name": "Benchmark",
+                "icon": None,
+                "description": "",
+                "bot_public": False,
+                "bot_require_code_grant": False,
+                "owner": self.owner,
+                "verify_key": "",
+                "flags": 0,
+                "interactions_endpoint_url": None,
+            }
+        )
+
+    async def _sync(self, request: web.Request) -> web.Response:
+        commands = await request.json()
+        for command in commands:
+            command.update(
+                id=str(self.snowflake()),
+                application_id=str(self.application_id),
+                version=str(self.snowflake()),
+            )
+        return _json(commands)
+
+    async def _callback(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        token = request.match_info["token"]
+        # 5 and 6 are deferrals, the command isn't done until its followup
+        if body["type"] == 8:
+            choices = body["data"]["choices"]
+            self._complete(token, {"content": f"{len(choices)} suggestions"})
+        elif body["type"] not in (5, 6):
+            self._complete(token, body.get("data") or {})
+        return _json(
+            {
+                "interaction": {
+                    "id": request.match_info["id"],
+                    "type": 2,
+                    "response_message_loading": body["type"] == 5,
+                    "response_message_ephemeral": False,
+                },
+                "resource": {"type": body["type"]},
+            }
+        )
+
+    async def _followup(self, request: web.Request) -> web.Response:
+        self._complete(request.match_info["token"], await request.json())
+        return _json(self._message_payload(request))
+
+    async def _message(self, request: web.Request) -> web.Response:
+        if request.content_type.startswith("multipart/"):
+            # Only the error reporter attaches files
+            self.errors_reported += 1
+        return _json(self._message_payload(request))
+
+    async def _no_content(self, request: web.Request) -> web.Response:  # noqa: ARG002
+        return web.Response(status=204)
+
+
+def _json(data: Any) -> web.Response:
+    # discord.py only parses bodies whose content type is exactly this
+    return web.Response(
+        body=json.dumps(data).encode(), headers={"Content-Type": "application/json"}
+    )
@@ -0,0 +1,346 @@
+import asyncio
+import base64
+import json
+import time
+import uuid
+from typing import Any
+
+from aiohttp import WSMsgType, web
+
+
+def encode_track(identifier: str, title: str, length: int) -> Any:
+    info = {
+        "identifier": identifier,
+        "isSeekable": True,
+        "author": "Benchmark",
+        "length": length,
+        "isStream": False,
+        "position": 0,
+        "title": title,
+        "uri": f"https://www.youtube.com/watch?v={identifier}",
+        "artworkUrl": None,
+        "isrc": None,
+        "sourceName": "youtube",
+    }
+    encoded = base64.b64encode(json.dumps(info).encode()).decode()
+    return {"encoded": encoded, "info": info, "pluginInfo": {}, "userData": {}}
+
+
+def decode_track(encoded: str) -> Any:
+    info = json.loads(base64.b64decode(encoded))
+    return {"encoded": encoded, "info": info, "pluginInfo": {}, "userData": {}}
+
+
+class FakePlayer:
+    def __init__(self, session: "FakeSession", guild_id: str) -> None:
+        self.session = session
+        self.guild_id = guild_id
+        self.track: Any = None
+        self.started_at = 0.0
+        self.paused = False
+        self.end_handle: asyncio.TimerHandle | None = None
+
+    def play(self, track: Any) -> None:
+        self.stop("replaced")
+        self.track = track
+        self.started_at = time.monotonic()
+        self.session.event(self.guild_id, "TrackStartEvent", track=track)
+        duration = self.session.server.track_seconds
+        if duration:
+            self.end_handle = asyncio.get_running_loop().call_later(
+                duration, self.stop, "finished"
+            )
+
+    def stop(self, reason: str) -> None:
+        if self.end_handle:
+            self.end_handle.cancel()
+            self.end_handle = None
+        if self.track is not None:
+            track, self.track = self.track, None
+            self.session.event(
+                self.guild_id, "TrackEndEvent", track=track, reason=reason
+            )
+
+    def position(self) -> int:
+        if self.track is None:
+            return 0
+        return int((time.monotonic() - self.started_at) * 1000)
+
+    def to_dict(self) -> Any:
+        return {
+            "guildId": self.guild_id,
+            "track": self.track,
+            "volume": 100,
+            "paused": self.paused,
+            "state": {
+                "time": int(time.time() * 1000),
+                "position": self.position(),
+                "connected": True,
+                "ping": 1,
+            },
+            "voice": {"token": "", "endpoint": "", "sessionId": ""},
+            "filters": {},
+        }
+
+
+class FakeSession:
+    def __init__(self, server: "FakeLavalink", request: web.Request) -> None:
+        self.server = server
+        self.request = request
+        self.ws = web.WebSocketResponse()
+        self.id = uuid.uuid4().hex
+        self.players: dict[str, FakePlayer] = {}
+
+    def send(self, data: Any) -> None:
+        if not self.ws.closed:
+            self.server.sent += 1
+            # Fire and forget, like Lavalink's own event stream
+            task = asyncio.create_task(self.ws.send_str(json.dumps(data)))
+            self.server.tasks.add(task)
+            task.add_done_callback(self.server.tasks.discard)
+
+    def event(self, guild_id: str, event_type: str, **data: Any) -> None:
+        self.send({"op": "event", "type": event_type, "guildId": guild_id, **data})
+
+
+class FakeLavalink:
+    """Just enough of the Lavalink v4 REST and websocket API to run the bot."""
+
+    def __init__(
+        self,
+        *,
+        password: str = "youshallnotpass",
+        track_seconds: float = 180,
+        rest_latency: float = 0.005,
+        update_interval: float = 5,
+        results: int = 5,
+    ) -> None:
+        self.password = password
+        self.track_seconds = track_seconds
+        self.rest_latency = rest_latency
+        self.update_interval = update_interval
+        self.results = results
+
+        self.sessions: dict[str, FakeSession] = {}
+        self.available = True
+        self.requests = 0
+        self.sent = 0
+        self.tasks: set[asyncio.Task[Any]] = set()
+        self.port = 0
+        self._runner: web.AppRunner | None = None
+        self._updates: asyncio.Task[None] | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/v4/websocket", self._websocket)
+        app.router.add_get("/v4/info", self._info)
+        app.router.add_get("/v4/stats", self._stats)
+        app.router.add_get("/v4/loadtracks", self._load_tracks)
+        app.router.add_post("/v4/decodetracks", self._decode_tracks)
+        app.router.add_patch("/v4/sessions/{session}", self._update_session)
+        app.router.add_patch(
+            "/v4/sessions/{session}/players/{guild}", self._update_player
+        )
+        app.router.add_delete(
+            "/v4/sessions/{session}/players/{guild}", self._destroy_player
+        )
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self.port = self._runner.addresses[0][1]
+        self._updates = asyncio.create_task(self._player_updates())
+
+    async def stop(self) -> None:
+        if self._updates:
+            self._updates.cancel()
+        await self._drop_sessions()
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def restart(self, downtime: float) -> None:
+        self.available = False
+        await self._drop_sessions()
+        await asyncio.sleep(downtime)
+        self.available = True
+
+    def set_track_seconds(self, seconds: float) -> None:
+        self.track_seconds = seconds
+        loop = asyncio.get_running_loop()
+        for session in self.sessions.values():
+            for player in session.players.values():
+                if player.end_handle:
+                    player.end_handle.cancel()
+                    player.end_handle = loop.call_later(
+                        seconds, player.stop, "finished"
+                    )
+
+    def playing(self) -> int:
+        return sum(
+            player.track is not None
+            for session in self.sessions.values()
+            for player in session.players.values()
+        )
+
+    async def _drop_sessions(self) -> None:
+        sessions = list(self.sessions.values())
+        self.sessions.clear()
+        for session in sessions:
+            for player in session.players.values():
+                if player.end_handle:
+                    player.end_handle.cancel()
+            # Drop the connection like a killed process would, without a close frame
+            if session.request.transport:
+                session.request.transport.abort()
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler: Any) -> Any:
+        if request.headers.get("Authorization") != self.password:
+            return _error(request, 401, "Unauthorized")
+        if not self.available:
+            return _error(request, 503, "Service Unavailable")
+        self.requests += 1
+        if self.rest_latency and request.path != "/v4/websocket":
+            await asyncio.sleep(self.rest_latency)
+        return await handler(request)
+
+    async def _websocket(self, request: web.Request) -> web.WebSocketResponse:
+        session = FakeSession(self, request)
+        ws = session.ws
+        await ws.prepare(request)
+        self.sessions[session.id] = session
+        session.send({"op": "ready", "resumed": False, "sessionId": session.id})
+        async for message in ws:
+            if message.type == WSMsgType.ERROR:
+                break
+        if self.sessions.get(session.id) is session:
+            del self.sessions[session.id]
+            for player in session.players.values():
+                if player.end_handle:
+                    player.end_handle.cancel()
+        return ws
+
+    def _session(self, request: web.Request) -> FakeSession:
+        session = self.sessions.get(request.match_info["session"])
+        if session is None:
+            response = _error(request, 404, "Not Found")
+            raise web.HTTPNotFound(body=response.body, content_type="application/json")
+        return session
+
+    async def _info(self, request: web.Request) -> web.Response:  # noqa: ARG002
+        return web.json_response(
+            {
+                "version": {"semver": "4.0.0", "major": 4, "minor": 0, "patch": 0},
+                "buildTime": 0,
+                "git": {"branch": "", "commit": "", "commitTime": 0},
+                "jvm": "",
+                "lavaplayer": "",
+                "sourceManagers": ["youtube"],
+                "filters": [],
+                "plugins": [],
+            }
+        )
+
+    async def _stats(self, request: web.Request) -> web.Response:  # noqa: ARG002
+        players = sum(len(session.players) for session in self.sessions.values())
+        return web.json_response(
+            {
+                "players": players,
+                "playingPlayers": self.playing(),
+                "uptime": 0,
+                "memory": {"free": 0, "used": 0, "allocated": 0, "reservable": 0},
+                "cpu": {"cores": 4, "systemLoad": 0.1, "lavalinkLoad": 0.05},
+                "frameStats": None,
+            }
+        )
+
+    async def _load_tracks(self, request: web.Request) -> web.Response:
+        identifier = request.query["identifier"]
+        length = int(self.track_seconds * 1000) or 180_000
+        # Playlist URLs with list=<name>-<count> load a playlist of that size
+        if identifier.startswith("https://www.youtube.com/playlist?list="):
+            name, _, count = identifier.rpartition("=")[2].partition("-")
+            tracks = [
+                encode_track(f"{name}-{i}", f"{name} track {i}", length)
+                for i in range(int(count or 10))
+            ]
+            return web.json_response(
+                {
+                    "loadType": "playlist",
+                    "data": {
+                        "info": {"name": name, "selectedTrack": -1},
+                        "pluginInfo": {},
+                        "tracks": tracks,
+                    },
+                }
+            )
+
+        query = identifier.removeprefix("ytsearch:")
+        tracks = [
+            encode_track(f"{query}-{i}", f"{query} {i}", length)
+            for i in range(self.results)
+        ]
+        return web.json_response({"loadType": "search", "data": tracks})
+
+    async def _decode_tracks(self, request: web.Request) -> web.Response:
+        encoded = await request.json()
+        return web.json_response([decode_track(track) for track in encoded])
+
+    async def _update_session(self, request: web.Request) -> web.Response:
+        self._session(request)
+        data = await request.json()
+        return web.json_response(
+            {"resuming": data.get("resuming", False), "timeout": data.get("timeout")}
+        )
+
+    async def _update_player(self, request: web.Request) -> web.Response:
+        session = self._session(request)
+        guild_id = request.match_info["guild"]
+        data = await request.json()
+
+        player = session.players.get(guild_id)
+        if player is None:
+            player = session.players[guild_id] = FakePlayer(session, guild_id)
+
+        if "paused" in data:
+            player.paused = data["paused"]
+        if "track" in data:
+            encoded = data["track"].get("encoded")
+            no_replace = request.query.get("noReplace") == "True"
+            if encoded is None:
+                player.stop("stopped")
+            elif not (no_replace and player.track is not None):
+                player.play(decode_track(encoded))
+        return web.json_response(player.to_dict())
+
+    async def _destroy_player(self, request: web.Request) -> web.Response:
+        session = self._session(request)
+        player = session.players.pop(request.match_info["guild"], None)
+        if player and player.end_handle:
+            player.end_handle.cancel()
+        return web.Response(status=204)
+
+    async def _player_updates(self) -> None:
+        while True:
+            await asyncio.sleep(self.update_interval)
+            for session in list(self.sessions.values()):
+                for player in list(session.players.values()):
+                    session.send(
+                        {
+                            "op": "playerUpdate",
+                            "guildId": player.guild_id,
+                            "state": player.to_dict()["state"],
+                        }
+                    )
+
+
+def _error(request: web.Request, status: int, error: str) -> web.Response:
+    return web.json_response(
+        {
+            "timestamp": int(time.time() * 1000),
+            "status": status,
+            "error": error,
+            "message": error,
+            "path": request.path,
+        },
+        status=status,
+    )
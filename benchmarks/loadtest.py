@@ -0,0 +1,517 @@
+import argparse
+import asyncio
+import contextlib
+import logging
+import random
+import resource
+import tempfile
+import time
+from collections import Counter, defaultdict
+from collections.abc import Awaitable, Iterable
+from pathlib import Path
+
+import yarl
+from discord import Intents
+from discord.ext import commands
+from discord.gateway import DiscordWebSocket, GatewayRatelimiter
+from discord.http import Route
+from fake_discord import FakeDiscord, FakeGuild
+from fake_lavalink import FakeLavalink
+from wavelink import Pool
+
+from discord_music_bot.bot import MyBot
+from discord_music_bot.cache import SearchCache
+from discord_music_bot.loader import TrackLoader
+from discord_music_bot.metrics import Metrics, resident_memory
+from discord_music_bot.nodes import NodeBalancer, NodeConfig
+from discord_music_bot.player import MyPlayer
+from discord_music_bot.store import PlayerStore
+from discord_music_bot.suggest import SearchSuggester
+from discord_music_bot.tree import MyTree
+
+OWNER_ID = 1
+BUSY = "Lavalink is busy, please try again."
+SCENARIOS = (
+    "playlists",
+    "skip-storm",
+    "remove-bump",
+    "autocomplete",
+    "queue",
+    "track-churn",
+    "node-restart",
+    "reload",
+    "rejoin",
+)
+
+
+class Harness:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.discord = FakeDiscord(
+            guilds=args.guilds,
+            owner_id=OWNER_ID,
+            idle_members=args.idle_members,
+            rest_latency=args.discord_latency,
+            voice_latency=args.voice_latency,
+        )
+        self.lavalinks = [
+            FakeLavalink(
+                track_seconds=args.track_seconds,
+                rest_latency=args.lavalink_latency,
+            )
+            for _ in range(args.nodes)
+        ]
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self._limit = asyncio.Semaphore(args.concurrency)
+
+    async def start(self, state_path: Path) -> MyBot:
+        await self.discord.start()
+        for lavalink in self.lavalinks:
+            await lavalink.start()
+
+        Route.BASE = f"http://127.0.0.1:{self.discord.port}/api/v10"
+        DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(
+            f"ws://127.0.0.1:{self.discord.port}/gateway"
+        )
+
+        if self.args.lean_cache:
+            intents = Intents.none()
+            intents.guilds = True
+            intents.voice_states = True
+        else:
+            intents = Intents.default()
+
+        metrics = Metrics()
+        track_loader = TrackLoader(SearchCache(), metrics)
+        self.bot = MyBot(
+            commands.when_mentioned,
+            tree_cls=MyTree,
+            intents=intents,
+            max_messages=None if self.args.lean_cache else 1000,
+            owner_id=OWNER_ID,
+            help_command=None,
+            # A single shard on the fake gateway, without asking it for a count
+            shard_count=1,
+            node_balancer=NodeBalancer(
+                [
+                    NodeConfig(
+                        f"node{i}", "127.0.0.1", lavalink.port, "youshallnotpass"
+                    )
+                    for i, lavalink in enumerate(self.lavalinks)
+                ],
+                stats_interval=5,
+                health_interval=1,
+                failover_after=self.args.failover_after,
+            ),
+            track_loader=track_loader,
+            search_suggester=SearchSuggester(track_loader),
+            player_store=PlayerStore(state_path),
+            idle_timeout=self.args.idle_timeout,
+            warm_grace=self.args.warm_grace,
+            metrics=metrics,
+            lean_cache=self.args.lean_cache,
+        )
+        self._bot_task = asyncio.create_task(self.bot.start("benchmark-token"))
+
+        start = time.perf_counter()
+        while not (
+            self.bot.is_ready()
+            and len(self.bot.node_balancer.connected_nodes()) == len(self.lavalinks)
+        ):
+            if self._bot_task.done():
+                self._bot_task.result()
+            await asyncio.sleep(0.05)
+        print(f"bot ready with {len(self.bot.guilds)} guilds in ", end="")
+        print(f"{time.perf_counter() - start:.2f}s")
+
+        if not self.args.gateway_ratelimit:
+            # Discord allows 120 gateway sends a minute per shard and every voice
+            # connect is one, which would otherwise dominate the results
+            for shard_id in self.bot.shards:
+                ws = self.bot._get_websocket(shard_id=shard_id)
+                ws._rate_limiter = GatewayRatelimiter(count=1_000_000)
+            print("gateway send limit lifted, see --gateway-ratelimit")
+        return self.bot
+
+    async def stop(self) -> None:
+        await self.bot.close()
+        with contextlib.suppress(Exception):
+            await self._bot_task
+        await Pool.close()
+        for lavalink in self.lavalinks:
+            await lavalink.stop()
+        await self.discord.stop()
+
+    async def command(
+        self, guild: FakeGuild, name: str, *, focused: str | None = None, **options: str
+    ) -> str:
+        label = name if focused is None else f"{name} autocomplete"
+        async with self._limit:
+            try:
+                async with asyncio.timeout(self.args.timeout):
+                    latency, reply = await self.discord.command(
+                        guild, name, focused=focused, **options
+                    )
+            except TimeoutError:
+                self.latencies[f"{label} (timed out)"].append(self.args.timeout)
+                return ""
+            self.latencies[label].append(latency)
+            return reply
+
+    def player(self, guild: FakeGuild) -> MyPlayer | None:
+        bot_guild = self.bot.get_guild(guild.id)
+        player = bot_guild.voice_client if bot_guild else None
+        return player if isinstance(player, MyPlayer) else None
+
+    def playing(self) -> int:
+        return sum(lavalink.playing() for lavalink in self.lavalinks)
+
+    async def settle(self) -> None:
+        with contextlib.suppress(TimeoutError):
+            async with asyncio.timeout(self.args.timeout):
+                while self.playing() < len(self.discord.guilds):
+                    await asyncio.sleep(0.05)
+        if self.playing() < len(self.discord.guilds):
+            print(f"only {self.playing()}/{len(self.discord.guilds)} players playing")
+
+    async def phase(self, name: str, jobs: Iterable[Awaitable[object]]) -> None:
+        self.latencies.clear()
+        self.discord.replies.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*jobs)
+        elapsed = time.perf_counter() - start
+        report(name, elapsed, self.latencies, self.discord.replies)
+
+    async def playlists(self) -> None:
+        size = self.args.playlist_size
+
+        async def queue_playlist(guild: FakeGuild) -> None:
+            await self.discord.join_voice(guild)
+            url = f"https://www.youtube.com/playlist?list=bench{guild.id}-{size}"
+            # Users do as they're told when the bot sheds load
+            while await self.command(guild, "play", song=url) == BUSY:
+                await asyncio.sleep(random.uniform(1, 3))
+
+        await self.phase(
+            f"{len(self.discord.guilds)} guilds queue a {size} track playlist",
+            (queue_playlist(guild) for guild in self.discord.guilds),
+        )
+        await self.settle()
+
+    async def skip_storm(self) -> None:
+        skips = self.args.skips
+        interval = self.args.skip_interval
+        players = [p for guild in self.discord.guilds if (p := self.player(guild))]
+        queued = sum(len(player.play_queue) for player in players)
+
+        async def skip(guild: FakeGuild, i: int) -> None:
+            await asyncio.sleep(i * interval)
+            await self.command(guild, "skip")
+
+        await self.phase(
+            f"{skips} skips per guild, {interval * 1000:.0f}ms apart"
+            if interval
+            else f"{skips} concurrent skips per guild",
+            (skip(guild, i) for guild in self.discord.guilds for i in range(skips)),
+        )
+        # Let the last jumps reach Lavalink before counting
+        await asyncio.sleep(0.5)
+        moved = queued - sum(len(player.play_queue) for player in players)
+        print(f"queues moved {moved} tracks")
+
+    async def remove_bump(self) -> None:
+        size = self.args.playlist_size
+
+        def jobs() -> Iterable[Awaitable[object]]:
+            for guild in self.discord.guilds:
+                for name in ("bump", "remove"):
+                    track = f"bench{guild.id} track {random.randrange(size)}"
+                    yield self.command(guild, name, song=track)
+
+        await self.phase("one /bump and one /remove per guild", jobs())
+
+    async def autocomplete(self) -> None:
+        interval = self.args.keystroke_interval
+        requests = sum(lavalink.requests for lavalink in self.lavalinks)
+
+        async def type_song(guild: FakeGuild) -> None:
+            # A handful of popular songs, so guilds share suggestions
+            song = f"popular song {guild.id % 20}"
+            keystrokes = []
+            for end in range(1, len(song) + 1):
+                keystrokes.append(
+                    asyncio.create_task(
+                        self.command(guild, "play", focused="song", song=song[:end])
+                    )
+                )
+                await asyncio.sleep(random.expovariate(1 / interval))
+            await asyncio.gather(*keystrokes)
+
+        await self.phase(
+            f"one user per guild types a song, a key every ~{interval * 1000:.0f}ms",
+            (type_song(guild) for guild in self.discord.guilds),
+        )
+        searches = sum(lavalink.requests for lavalink in self.lavalinks) - requests
+        print(f"{searches} Lavalink requests, {self.bot.search_suggester.outcomes}")
+
+    async def queue(self) -> None:
+        players = [p for guild in self.discord.guilds if (p := self.player(guild))]
+        renders = sum(player.queue_pages.renders for player in players)
+        await self.phase(
+            "three /queue per guild",
+            (self.command(guild, "queue") for guild in self.discord.guilds * 3),
+        )
+        renders = sum(player.queue_pages.renders for player in players) - renders
+        print(f"{renders} queue pages rendered")
+
+    async def track_churn(self) -> None:
+        duration = self.args.duration
+        players = [p for guild in self.discord.guilds if (p := self.player(guild))]
+        for player in players:
+            player.transition_gaps.clear()
+
+        started = 0
+
+        async def count(payload: object) -> None:  # noqa: ARG001
+            nonlocal started
+            started += 1
+
+        self.bot.add_listener(count, "on_wavelink_track_start")
+        for lavalink in self.lavalinks:
+            lavalink.set_track_seconds(self.args.churn_seconds)
+        await asyncio.sleep(duration)
+        for lavalink in self.lavalinks:
+            lavalink.set_track_seconds(self.args.track_seconds)
+        self.bot.remove_listener(count, "on_wavelink_track_start")
+
+        gaps = [gap for player in players for gap in player.transition_gaps]
+        print(f"\n== tracks ending every {self.args.churn_seconds}s for {duration}s")
+        print(f"{started / duration:.1f} tracks started/s")
+        if gaps:
+            print(f"transition gap {summary(gaps)}")
+
+    async def reload(self) -> None:
+        reloads = self.args.reloads
+        for lavalink in self.lavalinks:
+            lavalink.set_track_seconds(self.args.churn_seconds)
+
+        # Tracks keep ending while the music plugin is swapped out underneath
+        held = []
+        times = []
+        for _ in range(reloads):
+            await asyncio.sleep(self.args.duration / reloads)
+            start = time.perf_counter()
+            held.append(await self.bot.reload_plugin("music"))
+            times.append(time.perf_counter() - start)
+
+        for lavalink in self.lavalinks:
+            lavalink.set_track_seconds(self.args.track_seconds)
+        await self.settle()
+
+        print(
+            f"\n== {reloads} music plugin reloads with tracks ending every "
+            f"{self.args.churn_seconds}s"
+        )
+        print(f"reload {summary(times)}, {sum(held)} events held back")
+        print(f"{self.playing()}/{len(self.discord.guilds)} players still playing")
+
+    async def rejoin(self) -> None:
+        idle_timeout = self.args.idle_timeout
+        await asyncio.gather(*map(self.discord.leave_voice, self.discord.guilds))
+        await asyncio.sleep(idle_timeout + 1)
+
+        joins = self.discord.voice_joins
+
+        async def play_again(guild: FakeGuild) -> None:
+            await self.discord.join_voice(guild)
+            await self.command(guild, "play", song=f"bench{guild.id} comeback")
+
+        await self.phase(
+            f"everyone leaves for {idle_timeout + 1:.0f}s, comes back and plays a "
+            f"song (warm grace {self.args.warm_grace:.0f}s)",
+            map(play_again, self.discord.guilds),
+        )
+        print(f"{self.discord.voice_joins - joins} voice connects")
+
+    async def node_restart(self) -> None:
+        downtime = self.args.downtime
+        await self.settle()
+        before = self.playing()
+        moved = sum(
+            len(session.players) for session in self.lavalinks[0].sessions.values()
+        )
+        restart = asyncio.create_task(self.lavalinks[0].restart(downtime))
+        start = time.perf_counter()
+        await asyncio.sleep(0)
+        with contextlib.suppress(TimeoutError):
+            async with asyncio.timeout(downtime + self.args.timeout):
+                while self.playing() < before:
+                    await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        await restart
+        print(f"\n== node0 ({moved} players) restarts with {downtime}s downtime")
+        print(f"{self.playing()}/{before} players playing again after {elapsed:.2f}s")
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def summary(values: list[float]) -> str:
+    return (
+        f"p50 {percentile(values, 0.5) * 1000:7.1f}ms  "
+        f"p99 {percentile(values, 0.99) * 1000:7.1f}ms  "
+        f"max {max(values) * 1000:7.1f}ms"
+    )
+
+
+def report(
+    name: str,
+    elapsed: float,
+    latencies: dict[str, list[float]],
+    replies: Counter[str],
+) -> None:
+    total = sum(len(values) for values in latencies.values())
+    print(f"\n== {name}")
+    print(f"{total} commands in {elapsed:.2f}s, {total / elapsed:.1f} commands/s")
+    for command, values in sorted(latencies.items()):
+        print(f"  /{command:<20} n={len(values):<6} {summary(values)}")
+    for reply, count in replies.most_common():
+        print(f"  {count:>6} x {reply!r}")
+
+
+async def run(args: argparse.Namespace) -> None:
+    harness = Harness(args)
+    baseline = resident_memory()
+    with tempfile.TemporaryDirectory() as tmp:
+        bot = await harness.start(Path(tmp) / "state.sqlite3")
+        try:
+            await harness.playlists()
+            for scenario in args.scenarios:
+                match scenario:
+                    case "skip-storm":
+                        await harness.skip_storm()
+                    case "remove-bump":
+                        await harness.remove_bump()
+                    case "autocomplete":
+                        await harness.autocomplete()
+                    case "queue":
+                        await harness.queue()
+                    case "track-churn":
+                        await harness.track_churn()
+                    case "node-restart":
+                        await harness.node_restart()
+                    case "reload":
+                        await harness.reload()
+                    case "rejoin":
+                        await harness.rejoin()
+
+            used = resident_memory() - baseline
+            queued = sum(
+                len(player.play_queue)
+                for guild in harness.discord.guilds
+                if (player := harness.player(guild))
+            )
+            members = sum(len(guild.members) for guild in bot.guilds)
+            print("\n== totals")
+            print(
+                f"{members} members cached, "
+                f"{bot.member_cache.evicted} evicted by the lean cache policy"
+            )
+            print(
+                f"RSS +{used / 2**20:.1f} MiB "
+                f"({used / max(len(bot.guilds), 1) / 1024:.1f} KiB/guild, "
+                f"{queued} tracks queued, fakes included)"
+            )
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"peak RSS {peak:.1f} MiB")
+            print(
+                f"{sum(harness.discord.requests.values())} Discord REST requests, "
+                f"{sum(lavalink.requests for lavalink in harness.lavalinks)} "
+                f"Lavalink REST requests, {harness.discord.errors_reported} error "
+                "reports to the owner"
+            )
+        finally:
+            await harness.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Drive the bot against a fake Discord and fake Lavalink nodes. "
+            "Everything runs in this process, so numbers are for comparing "
+            "revisions on the same machine, not absolute capacity."
+        )
+    )
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        default=SCENARIOS[1:],
+        help=(
+            f"any of {', '.join(SCENARIOS)}; "
+            "playlists always runs first to set up the players"
+        ),
+    )
+    parser.add_argument("--guilds", type=int, default=1000)
+    parser.add_argument("--nodes", type=int, default=2)
+    parser.add_argument(
+        "--idle-members",
+        type=int,
+        default=5,
+        help="members per guild sitting in another voice channel",
+    )
+    parser.add_argument("--playlist-size", type=int, default=100)
+    parser.add_argument("--skips", type=int, default=10)
+    parser.add_argument(
+        "--skip-interval",
+        type=float,
+        default=0,
+        help="seconds between a guild's skips, all at once by default",
+    )
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--track-seconds", type=float, default=180)
+    parser.add_argument("--churn-seconds", type=float, default=1)
+    parser.add_argument("--keystroke-interval", type=float, default=0.15)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--downtime", type=float, default=2)
+    parser.add_argument(
+        "--failover-after",
+        type=float,
+        default=1,
+        help="how long a node may be down before its players are moved",
+    )
+    parser.add_argument("--reloads", type=int, default=5)
+    parser.add_argument("--idle-timeout", type=float, default=1)
+    parser.add_argument("--warm-grace", type=float, default=60)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--discord-latency", type=float, default=0.02)
+    parser.add_argument(
+        "--voice-latency",
+        type=float,
+        default=0.15,
+        help="time Discord takes to hand out a voice server on join",
+    )
+    parser.add_argument("--lavalink-latency", type=float, default=0.005)
+    parser.add_argument(
+        "--gateway-ratelimit",
+        action="store_true",
+        help="keep discord.py's limit of ~2 gateway sends per second",
+    )
+    parser.add_argument(
+        "--lean-cache",
+        action="store_true",
+        help="run with LEAN_CACHE's intents, message and member caching",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+    for scenario in args.scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"unknown scenario {scenario!r}")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import base64
+import gc
+import os
+import tracemalloc
+from collections import deque
+from collections.abc import Callable
+from typing import Any
+
+from wavelink import Playable
+
+from discord_music_bot.track_queue import TrackQueue
+
+
+def make_payload(i: int) -> Any:
+    return {
+        "encoded": base64.b64encode(os.urandom(240)).decode(),
+        "info": {
+            "identifier": f"{i:011d}",
+            "isSeekable": True,
+            "author": f"Artist {i % 997}",
+            "length": 180_000 + i % 60_000,
+            "isStream": False,
+            "position": 0,
+            "title": f"Artist {i % 997} - Some Song Title Number {i}",
+            "uri": f"https://www.youtube.com/watch?v={i:011d}",
+            "artworkUrl": f"https://i.ytimg.com/vi/{i:011d}/maxresdefault.jpg",
+            "isrc": None,
+            "sourceName": "youtube",
+        },
+        "pluginInfo": {},
+        "userData": {},
+    }
+
+
+def measure(
+    build: Callable[[list[Playable]], object], players: int, tracks: int
+) -> int:
+    queues = []
+    gc.collect()
+    tracemalloc.start()
+    for _ in range(players):
+        # Every player gets its own search results, like separate /play calls
+        results = [Playable(make_payload(i)) for i in range(tracks)]
+        queues.append(build(results))
+        del results
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure queue memory for full Playables vs compact entries."
+    )
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--tracks", type=int, default=10_000)
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=5,
+        help="players actually built; the total is extrapolated from them",
+    )
+    args = parser.parse_args()
+
+    sample = min(args.sample, args.players)
+    for name, build in (("deque[Playable]", deque), ("TrackQueue", TrackQueue)):
+        used = measure(build, sample, args.tracks)
+        per_track = used / (sample * args.tracks)
+        total = per_track * args.players * args.tracks
+        print(
+            f"{name:>16}: {per_track:7.0f} B/track, "
+            f"{total / 2**30:7.2f} GiB for {args.players} players "
+            f"x {args.tracks} tracks"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+
+def run_once(timeout: float) -> tuple[float, bool]:
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "discord_music_bot"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    assert process.stdout is not None
+    skipped = False
+    try:
+        for line in process.stdout:
+            if "skipped sync" in line:
+                skipped = True
+            if "Ready" in line and "after startup" in line:
+                return time.perf_counter() - start, skipped
+            if time.perf_counter() - start > timeout:
+                break
+        msg = "the bot did not become ready"
+        raise RuntimeError(msg)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Measure the time from process start to on_ready. "
+            "Uses the same environment/.env as the bot itself."
+        )
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    results = [run_once(args.timeout) for _ in range(args.runs)]
+    for i, (elapsed, skipped) in enumerate(results, 1):
+        sync = "skipped" if skipped else "synced"
+        print(f"run {i}: {elapsed:.2f}s (command tree {sync})")
+
+    times = [elapsed for elapsed, _ in results]
+    print(f"mean {statistics.mean(times):.2f}s, min {min(times):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
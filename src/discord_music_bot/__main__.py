@@ -1,35 +1,211 @@
+import asyncio
+import logging
+from multiprocessing.queues import Queue
+from multiprocessing.sharedctypes import Synchronized
+from pathlib import Path
+
 from discord import Intents
 from discord.ext import commands
+from discord.utils import setup_logging
 from typenv import Env
 
 from discord_music_bot.bot import MyBot
+from discord_music_bot.cache import SearchCache
+from discord_music_bot.cluster import (
+    ClusterConfig,
+    ClusterHealth,
+    Supervisor,
+    fetch_shard_count,
+    plan_clusters,
+    report_health,
+)
+from discord_music_bot.loader import TrackLoader
+from discord_music_bot.metrics import Metrics
+from discord_music_bot.nodes import NodeBalancer, NodeConfig
+from discord_music_bot.store import PlayerStore
+from discord_music_bot.suggest import SearchSuggester
 from discord_music_bot.tree import MyTree
 
 
-def main() -> None:
+def read_env() -> Env:
     env = Env()
     env.read_env()
+    return env
 
-    token = env.str("TOKEN")
+
+def read_node_configs(env: Env) -> list[NodeConfig]:
+    with env.prefixed("LAVALINK_"):
+        node_prefixes = {
+            name: f"{name.upper()}_" for name in env.list("NODES", default=[])
+        } or {"default": ""}
+        node_configs = []
+        for name, prefix in node_prefixes.items():
+            with env.prefixed(prefix):
+                node_configs.append(
+                    NodeConfig(
+                        name,
+                        env.str("HOST"),
+                        env.int("PORT"),
+                        env.str("PASSWORD"),
+                        env.str("REGION", default=None),
+                    )
+                )
+    return node_configs
+
+
+def create_bot(
+    env: Env,
+    *,
+    cluster: ClusterConfig | None = None,
+    identify_gate: "Synchronized[float] | None" = None,
+) -> MyBot:
     owner_id = env.int("OWNER_ID")
     test_guild_id = env.int("TEST_GUILD_ID", default=None)
+    state_path = Path(env.str("STATE_PATH", default="state.sqlite3"))
+    idle_timeout = env.float("IDLE_TIMEOUT", default=15)
+    warm_grace = env.float("WARM_GRACE", default=60)
+    lean_cache = env.bool("LEAN_CACHE", default=False)
+    shard_count = env.int("SHARD_COUNT", default=None)
 
+    node_configs = read_node_configs(env)
     with env.prefixed("LAVALINK_"):
-        lavalink_connection = (env.str("HOST"), env.int("PORT"), env.str("PASSWORD"))
+        region_penalty = env.float("REGION_PENALTY", default=200)
+        max_concurrency = env.int("MAX_CONCURRENCY", default=8)
+        max_pending = env.int("MAX_PENDING", default=64)
+        failover_after = env.float("FAILOVER_AFTER", default=10)
 
-    intents = Intents.default()
+    with env.prefixed("SEARCH_CACHE_"):
+        search_cache = SearchCache(
+            max_size=env.int("SIZE", default=1024),
+            ttl=env.float("TTL", default=6 * 60 * 60),
+            negative_ttl=env.float("NEGATIVE_TTL", default=5 * 60),
+            playlist_ttl=env.float("PLAYLIST_TTL", default=30 * 60),
+        )
 
-    bot = MyBot(
+    with env.prefixed("AUTOCOMPLETE_"):
+        debounce = env.float("DEBOUNCE", default=0.3)
+        budget = env.float("BUDGET", default=1.5)
+        max_inflight = env.int("MAX_INFLIGHT", default=4)
+
+    with env.prefixed("METRICS_"):
+        metrics_host = env.str("HOST", default="127.0.0.1")
+        metrics_port = env.int("PORT", default=None)
+
+    shard_ids = None
+    if cluster:
+        shard_ids = cluster.shard_ids
+        shard_count = cluster.shard_count
+        node_configs = cluster.nodes
+        # Every cluster gets its own metrics port, counting up from the first one
+        if metrics_port:
+            metrics_port += cluster.cluster_id
+
+    metrics = Metrics()
+    track_loader = TrackLoader(
+        search_cache,
+        metrics,
+        max_concurrency=max_concurrency,
+        max_pending=max_pending,
+    )
+
+    if lean_cache:
+        # Slash commands and voice are all we need, everything else only
+        # fills caches
+        intents = Intents.none()
+        intents.guilds = True
+        intents.voice_states = True
+    else:
+        intents = Intents.default()
+
+    return MyBot(
         commands.when_mentioned,
         tree_cls=MyTree,
         intents=intents,
+        max_messages=None if lean_cache else 1000,
         owner_id=owner_id,
         help_command=None,
-        lavalink_connection=lavalink_connection,
+        shard_ids=shard_ids,
+        shard_count=shard_count,
+        node_balancer=NodeBalancer(
+            node_configs,
+            region_penalty=region_penalty,
+            failover_after=failover_after,
+        ),
+        track_loader=track_loader,
+        search_suggester=SearchSuggester(
+            track_loader, debounce=debounce, budget=budget, max_inflight=max_inflight
+        ),
+        player_store=PlayerStore(state_path),
+        idle_timeout=idle_timeout,
+        warm_grace=warm_grace,
         test_guild_id=test_guild_id,
+        metrics=metrics,
+        metrics_address=(metrics_host, metrics_port) if metrics_port else None,
+        sync_commands=cluster is None or cluster.cluster_id == 0,
+        identify_gate=identify_gate,
+        lean_cache=lean_cache,
     )
 
-    bot.run(token)
+
+def run_cluster(
+    cluster: ClusterConfig,
+    health: "Queue[ClusterHealth]",
+    identify_gate: "Synchronized[float]",
+) -> None:
+    env = read_env()
+    token = env.str("TOKEN")
+    health_interval = env.float("CLUSTER_HEALTH_INTERVAL", default=10)
+
+    setup_logging(
+        formatter=logging.Formatter(
+            f"[{{asctime}}] [{{levelname:<8}}] cluster {cluster.cluster_id} "
+            "{name}: {message}",
+            "%Y-%m-%d %H:%M:%S",
+            style="{",
+        ),
+        root=True,
+    )
+
+    async def runner() -> None:
+        bot = create_bot(env, cluster=cluster, identify_gate=identify_gate)
+        async with bot:
+            reporter = asyncio.create_task(
+                report_health(bot, cluster.cluster_id, health, health_interval)
+            )
+            try:
+                await bot.start(token)
+            finally:
+                reporter.cancel()
+
+    try:
+        asyncio.run(runner())
+    except KeyboardInterrupt:
+        pass
+
+
+def main() -> None:
+    env = read_env()
+
+    token = env.str("TOKEN")
+    clusters = env.int("CLUSTERS", default=1)
+
+    if clusters <= 1:
+        bot = create_bot(env)
+        bot.run(token, root_logger=True)
+        return
+
+    setup_logging(root=True)
+    shard_count = env.int("SHARD_COUNT", default=None) or asyncio.run(
+        fetch_shard_count(token)
+    )
+    with env.prefixed("CLUSTER_"):
+        supervisor = Supervisor(
+            plan_clusters(clusters, shard_count, read_node_configs(env)),
+            run_cluster,
+            health_interval=env.float("HEALTH_INTERVAL", default=10),
+            stale_after=env.float("STALE_AFTER", default=60),
+        )
+    supervisor.run()
 
 
 if __name__ == "__main__":
@@ -1,59 +1,255 @@
-import io
+import asyncio
+import hashlib
+import json
+import logging
 import signal
+import time
+from multiprocessing.sharedctypes import Synchronized
 from pathlib import Path
 from sys import exc_info
-from traceback import format_exception
 from typing import Any
 
-from discord import File, Object
+from discord import Interaction, Object
+from discord.app_commands import Command, ContextMenu
 from discord.ext import commands
-from wavelink import Node, NodeReadyEventPayload, Pool
+from discord.utils import utcnow
+from wavelink import NodeReadyEventPayload, Pool
 
+from discord_music_bot.cluster import reserve_identify
+from discord_music_bot.errors import ErrorReporter
+from discord_music_bot.idle import IdleScheduler
+from discord_music_bot.loader import TrackLoader
+from discord_music_bot.members import MemberCachePolicy
+from discord_music_bot.metrics import Labels, Metrics, resident_memory
+from discord_music_bot.nodes import NodeBalancer
+from discord_music_bot.profiling import Profiler
+from discord_music_bot.store import PlayerState, PlayerStore
+from discord_music_bot.suggest import SearchSuggester
 
-class MyBot(commands.Bot):
+logger = logging.getLogger(__name__)
+
+
+class MyBot(commands.AutoShardedBot):
     def __init__(
         self,
         *args: Any,
-        lavalink_connection: tuple[str, int, str],
+        node_balancer: NodeBalancer,
+        track_loader: TrackLoader,
+        search_suggester: SearchSuggester,
+        player_store: PlayerStore,
+        idle_timeout: float = 15,
+        warm_grace: float = 60,
         test_guild_id: int | None = None,
+        metrics: Metrics,
+        metrics_address: tuple[str, int] | None = None,
+        sync_commands: bool = True,
+        identify_gate: "Synchronized[float] | None" = None,
+        lean_cache: bool = False,
         **kwargs: Any,
     ):
         super().__init__(*args, **kwargs)
-        self.lavalink_connection = lavalink_connection
+        self.started_at = time.perf_counter()
+        self.ready_after: float | None = None
+        self.node_balancer = node_balancer
+        self.track_loader = track_loader
+        self.search_suggester = search_suggester
+        self.player_store = player_store
+        self.idle_scheduler = IdleScheduler(idle_timeout, self._idle)
+        self.warm_scheduler = IdleScheduler(warm_grace, self._idle_disconnect)
         self.test_guild_id = test_guild_id
+        self.pending_restores: dict[int, PlayerState] = {}
+        self.error_reporter = ErrorReporter(self)
+        self.metrics = metrics
+        self.metrics_address = metrics_address
+        self.sync_commands = sync_commands
+        self.identify_gate = identify_gate
+        self.member_cache = MemberCachePolicy(lean=lean_cache)
+        self.profiler = Profiler()
+
+        self._reload_lock = asyncio.Lock()
+        self._held_events: list[tuple[str, tuple[Any, ...], dict[str, Any]]] | None = (
+            None
+        )
 
     async def setup_hook(self) -> None:
         signal.signal(signal.SIGTERM, signal.getsignal(signal.SIGINT))
 
+        self.pending_restores = await self.player_store.open()
+        if self.shard_ids is not None:
+            # The state file is shared between clusters, keep our own guilds only
+            self.pending_restores = {
+                guild_id: state
+                for guild_id, state in self.pending_restores.items()
+                if (guild_id >> 22) % self.shard_count in self.shard_ids
+            }
+
+        self.metrics.collector(
+            "bot_players", "Connected players per node.", self._players_per_node
+        )
+        self.metrics.collector(
+            "bot_search_cache_hits_total",
+            "Search cache hits.",
+            lambda: [(self.track_loader.cache.hits, ())],
+            kind="counter",
+        )
+        self.metrics.collector(
+            "bot_search_cache_misses_total",
+            "Search cache misses.",
+            lambda: [(self.track_loader.cache.misses, ())],
+            kind="counter",
+        )
+        self.metrics.collector(
+            "bot_autocomplete_requests_total",
+            "/play autocomplete requests by outcome.",
+            lambda: [
+                (count, (("outcome", outcome),))
+                for outcome, count in self.search_suggester.outcomes.items()
+            ],
+            kind="counter",
+        )
+        self.metrics.collector(
+            "bot_cached_members",
+            "Members held in the member cache.",
+            lambda: [(sum(len(guild.members) for guild in self.guilds), ())],
+        )
+        self.metrics.collector(
+            "bot_evicted_members_total",
+            "Members evicted from the cache by the lean cache policy.",
+            lambda: [(self.member_cache.evicted, ())],
+            kind="counter",
+        )
+        self.metrics.collector(
+            "bot_warm_players",
+            "Idle players kept connected but paused.",
+            lambda: [(len(self.warm_scheduler), ())],
+        )
+        self.metrics.collector(
+            "process_resident_memory_bytes",
+            "Resident memory size in bytes.",
+            lambda: [(resident_memory(), ())],
+        )
+        if self.metrics_address:
+            await self.metrics.start(*self.metrics_address)
+
         modules = Path(__file__).parent / "plugins"
         for f in modules.glob("*.py"):
             if f.is_file() and f.name != "__init__.py":
                 await self.load_extension(f"discord_music_bot.plugins.{f.stem}")
 
+        await self.publish_commands()
+
+    async def publish_commands(self) -> None:
+        test_guild = None
         if self.test_guild_id:
             test_guild = Object(id=self.test_guild_id)
             self.tree.copy_global_to(guild=test_guild)
-            await self.tree.sync(guild=test_guild)
-        else:
-            await self.tree.sync()
+        if self.sync_commands:
+            await self.sync_tree(test_guild)
+
+    def dispatch(self, event_name: str, /, *args: Any, **kwargs: Any) -> None:
+        if self._held_events is not None:
+            self._held_events.append((event_name, args, kwargs))
+            return
+        super().dispatch(event_name, *args, **kwargs)
+
+    async def reload_plugin(self, name: str) -> int:
+        async with self._reload_lock:
+            # Players and their queues live on the voice clients, so they
+            # survive the reload. Events arriving while the old listeners are
+            # gone and the new ones aren't in place yet are held back, and
+            # replayed in order once they are.
+            self._held_events = []
+            try:
+                await self.reload_extension(f"discord_music_bot.plugins.{name}")
+            finally:
+                held, self._held_events = self._held_events, None
+                for event_name, args, kwargs in held:
+                    super().dispatch(event_name, *args, **kwargs)
+
+        logger.info("Reloaded plugin %s, replayed %s events", name, len(held))
+        await self.publish_commands()
+        return len(held)
+
+    async def before_identify_hook(
+        self, shard_id: int | None, *, initial: bool = False
+    ) -> None:
+        if self.identify_gate is None:
+            await super().before_identify_hook(shard_id, initial=initial)
+            return
+
+        await asyncio.sleep(reserve_identify(self.identify_gate))
+
+    async def sync_tree(self, guild: Object | None) -> None:
+        payload = [
+            command.to_dict(self.tree)
+            for command in self.tree.get_commands(guild=guild)
+        ]
+        tree_hash = hashlib.sha256(
+            json.dumps(payload, sort_keys=True).encode()
+        ).hexdigest()
+        key = f"command_tree:{self.application_id}:{guild.id if guild else 'global'}"
+
+        if await self.player_store.get_meta(f"{key}:hash") == tree_hash:
+            saved = await self.player_store.get_meta(f"{key}:sync_time")
+            logger.info(
+                "Command tree unchanged, skipped sync (saved ~%ss)", saved or "?"
+            )
+            return
+
+        start = time.perf_counter()
+        await self.tree.sync(guild=guild)
+        sync_time = time.perf_counter() - start
+        logger.info("Synced command tree in %.2fs", sync_time)
+
+        await self.player_store.set_meta(f"{key}:hash", tree_hash)
+        await self.player_store.set_meta(f"{key}:sync_time", f"{sync_time:.2f}")
+
+    async def close(self) -> None:
+        try:
+            await self.player_store.close()
+        finally:
+            await self.metrics.stop()
+            await super().close()
+
+    def _players_per_node(self) -> list[tuple[float, Labels]]:
+        return [
+            (len(node.players), (("node", identifier),))
+            for identifier, node in Pool.nodes.items()
+        ]
+
+    async def _idle(self, guild_id: int) -> None:
+        guild = self.get_guild(guild_id)
+        if guild and guild.voice_client:
+            self.dispatch("player_idle", guild)
+
+    async def _idle_disconnect(self, guild_id: int) -> None:
+        guild = self.get_guild(guild_id)
+        if guild and guild.voice_client:
+            await guild.voice_client.disconnect(force=False)
 
     async def on_ready(self) -> None:
         print(f"Logged on as {self.user}!")
+        if self.ready_after is None:
+            self.ready_after = time.perf_counter() - self.started_at
+            logger.info("Ready %.2fs after startup", self.ready_after)
 
-        host, port, password = self.lavalink_connection
-        node = Node(uri=f"http://{host}:{port}", password=password)
-        await Pool.connect(client=self, nodes=[node])
+        await self.node_balancer.connect(self)
 
     async def on_wavelink_node_ready(self, payload: NodeReadyEventPayload) -> None:
         print(f"Node {payload.node.identifier} is ready!")
 
-        for player in list(payload.node.players.values()):
-            await player.disconnect()
+        await self.node_balancer.node_ready(payload)
+
+    async def on_app_command_completion(
+        self,
+        interaction: Interaction["MyBot"],
+        command: Command[Any, ..., Any] | ContextMenu,
+    ) -> None:
+        latency = (utcnow() - interaction.created_at).total_seconds()
+        self.metrics.command_latency.observe(
+            latency, command=command.qualified_name, status="ok"
+        )
 
     async def on_error(self, event_method: str, /, *args: Any, **kwargs: Any) -> None:
-        if not self.owner_id:
-            return
-        target = await self.fetch_user(self.owner_id)
-        tb = format_exception(*exc_info())
-        file = File(io.BytesIO("".join(tb).encode()), filename="traceback.txt")
-        await target.send(f"Handler `{event_method}` raised an exception", file=file)
+        if error := exc_info()[1]:
+            self.error_reporter.report(f"Handler `{event_method}`", error)
@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+
+from wavelink import Playable, Playlist, Search
+
+
+class SearchCache:
+    def __init__(
+        self,
+        *,
+        max_size: int = 1024,
+        ttl: float = 6 * 60 * 60,
+        negative_ttl: float = 5 * 60,
+        playlist_ttl: float = 30 * 60,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.playlist_ttl = playlist_ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: OrderedDict[str, tuple[float, Search]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, query: str) -> list[Playable] | Playlist | None:
+        entry = self._entries.get(query)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires, results = entry
+        if expires <= time.monotonic():
+            del self._entries[query]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(query)
+        self.hits += 1
+        return results
+
+    def put(self, query: str, results: Search) -> None:
+        if isinstance(results, Playlist):
+            ttl = self.playlist_ttl
+        elif not results:
+            ttl = self.negative_ttl
+        elif any(track.is_stream for track in results):
+            return
+        else:
+            ttl = self.ttl
+
+        if self.max_size <= 0 or ttl <= 0:
+            return
+
+        self._entries[query] = (time.monotonic() + ttl, results)
+        self._entries.move_to_end(query)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
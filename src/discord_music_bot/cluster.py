@@ -0,0 +1,245 @@
+import asyncio
+import ctypes
+import logging
+import math
+import multiprocessing
+import queue
+import signal
+import time
+from collections.abc import Callable
+from multiprocessing.context import SpawnProcess
+from multiprocessing.queues import Queue
+from multiprocessing.sharedctypes import Synchronized
+from types import FrameType
+from typing import NamedTuple
+
+from discord.ext import commands
+from discord.http import HTTPClient
+from wavelink import NodeStatus, Pool
+
+from discord_music_bot.nodes import NodeConfig
+
+logger = logging.getLogger(__name__)
+
+IDENTIFY_INTERVAL = 5
+
+
+class ClusterConfig(NamedTuple):
+    cluster_id: int
+    shard_ids: list[int]
+    shard_count: int
+    nodes: list[NodeConfig]
+
+
+class ClusterHealth(NamedTuple):
+    cluster_id: int
+    ready: bool
+    guilds: int
+    players: int
+    latency: float
+    nodes_connected: int
+
+
+def plan_clusters(
+    clusters: int, shard_count: int, nodes: list[NodeConfig]
+) -> list[ClusterConfig]:
+    if not 0 < clusters <= shard_count:
+        msg = f"Can't split {shard_count} shards into {clusters} clusters"
+        raise ValueError(msg)
+
+    plan = []
+    for i in range(clusters):
+        start = shard_count * i // clusters
+        end = shard_count * (i + 1) // clusters
+        # Spread the nodes over the clusters, sharing them if there are too few
+        cluster_nodes = nodes[i::clusters] or [nodes[i % len(nodes)]]
+        plan.append(
+            ClusterConfig(i, list(range(start, end)), shard_count, cluster_nodes)
+        )
+    return plan
+
+
+def reserve_identify(gate: "Synchronized[float]") -> float:
+    # Identifies are limited per bot, not per process. Every one gets its own
+    # slot after the last one handed out, so nothing is held while waiting
+    # and a cluster dying at any point can't block the others.
+    with gate.get_lock():
+        now = time.monotonic()
+        start = max(now, gate.value)
+        gate.value = start + IDENTIFY_INTERVAL
+    return start - now
+
+
+async def fetch_shard_count(token: str) -> int:
+    http = HTTPClient(asyncio.get_running_loop())
+    try:
+        await http.static_login(token)
+        shard_count, _, _ = await http.get_bot_gateway()
+    finally:
+        await http.close()
+    return shard_count
+
+
+async def report_health(
+    bot: commands.AutoShardedBot,
+    cluster_id: int,
+    health: "Queue[ClusterHealth]",
+    interval: float,
+) -> None:
+    while True:
+        health.put(
+            ClusterHealth(
+                cluster_id,
+                bot.is_ready(),
+                len(bot.guilds),
+                len(bot.voice_clients),
+                -1 if math.isnan(bot.latency) else bot.latency,
+                sum(
+                    node.status is NodeStatus.CONNECTED for node in Pool.nodes.values()
+                ),
+            )
+        )
+        await asyncio.sleep(interval)
+
+
+class Supervisor:
+    def __init__(
+        self,
+        plan: list[ClusterConfig],
+        target: Callable[
+            [ClusterConfig, "Queue[ClusterHealth]", "Synchronized[float]"], None
+        ],
+        *,
+        health_interval: float = 10,
+        stale_after: float = 60,
+        max_backoff: float = 60,
+        shutdown_timeout: float = 30,
+    ) -> None:
+        self.plan = plan
+        self.target = target
+        self.health_interval = health_interval
+        self.stale_after = stale_after
+        self.max_backoff = max_backoff
+        self.shutdown_timeout = shutdown_timeout
+
+        self._context = multiprocessing.get_context("spawn")
+        self._health: Queue[ClusterHealth] = self._context.Queue()
+        self._identify_gate = self._context.Value(ctypes.c_double, 0)
+        self._processes: dict[int, SpawnProcess] = {}
+        self._last_health: dict[int, ClusterHealth] = {}
+        self._last_seen: dict[int, float] = {}
+        self._restarts: dict[int, int] = {}
+        self._restart_at: dict[int, float] = {}
+        self._stopping = False
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        for cluster in self.plan:
+            self._start(cluster)
+
+        next_summary = time.monotonic() + self.health_interval
+        while not self._stopping:
+            try:
+                health = self._health.get(timeout=1)
+            except queue.Empty:
+                pass
+            else:
+                self._last_health[health.cluster_id] = health
+                self._last_seen[health.cluster_id] = time.monotonic()
+                if health.ready:
+                    self._restarts.pop(health.cluster_id, None)
+
+            self._check()
+            if time.monotonic() >= next_summary:
+                next_summary += self.health_interval
+                self._log_summary()
+
+        self._shutdown()
+
+    def _start(self, cluster: ClusterConfig) -> None:
+        process = self._context.Process(
+            target=self.target,
+            args=(cluster, self._health, self._identify_gate),
+            name=f"cluster-{cluster.cluster_id}",
+        )
+        process.start()
+        self._processes[cluster.cluster_id] = process
+        self._last_seen[cluster.cluster_id] = time.monotonic()
+        self._last_health.pop(cluster.cluster_id, None)
+        self._restart_at.pop(cluster.cluster_id, None)
+        logger.info(
+            "Started cluster %s (pid %s) with shards %s-%s on %s",
+            cluster.cluster_id,
+            process.pid,
+            cluster.shard_ids[0],
+            cluster.shard_ids[-1],
+            ", ".join(node.identifier for node in cluster.nodes),
+        )
+
+    def _check(self) -> None:
+        now = time.monotonic()
+        for cluster in self.plan:
+            cluster_id = cluster.cluster_id
+            if cluster_id in self._restart_at:
+                if now >= self._restart_at[cluster_id]:
+                    self._start(cluster)
+                continue
+
+            process = self._processes[cluster_id]
+            if (
+                process.is_alive()
+                and now - self._last_seen[cluster_id] < self.stale_after
+            ):
+                continue
+
+            if process.is_alive():
+                logger.warning(
+                    "Cluster %s stopped reporting, restarting it", cluster_id
+                )
+                process.kill()
+            else:
+                logger.warning(
+                    "Cluster %s exited with code %s", cluster_id, process.exitcode
+                )
+            process.join()
+
+            restarts = self._restarts.get(cluster_id, 0)
+            self._restarts[cluster_id] = restarts + 1
+            self._restart_at[cluster_id] = now + min(2**restarts, self.max_backoff)
+
+    def _log_summary(self) -> None:
+        for cluster in self.plan:
+            health = self._last_health.get(cluster.cluster_id)
+            if health is None:
+                logger.info("Cluster %s: no report yet", cluster.cluster_id)
+                continue
+            logger.info(
+                "Cluster %s: %s, %s guilds, %s players, %.0fms latency, "
+                "%s/%s nodes connected",
+                cluster.cluster_id,
+                "ready" if health.ready else "starting",
+                health.guilds,
+                health.players,
+                health.latency * 1000,
+                health.nodes_connected,
+                len(cluster.nodes),
+            )
+
+    def _stop(self, signum: int, frame: FrameType | None) -> None:  # noqa: ARG002
+        self._stopping = True
+
+    def _shutdown(self) -> None:
+        logger.info("Stopping %s clusters", len(self._processes))
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for process in self._processes.values():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning("%s didn't stop in time, killing it", process.name)
+                process.kill()
+                process.join()
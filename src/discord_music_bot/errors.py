@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import io
+import logging
+import time
+from traceback import TracebackException
+
+from discord import DMChannel, File, HTTPException
+from discord.ext import commands
+
+logger = logging.getLogger(__name__)
+
+
+class ErrorReporter:
+    def __init__(
+        self,
+        client: commands.AutoShardedBot,
+        *,
+        window: float = 10,
+        max_queue: int = 1000,
+    ) -> None:
+        self.client = client
+        self.window = window
+
+        self._queue: asyncio.Queue[tuple[str, str, str]] = asyncio.Queue(max_queue)
+        self._task: asyncio.Task[None] | None = None
+        self._dm_channel: DMChannel | None = None
+
+    def report(self, title: str, error: BaseException) -> None:
+        if not self.client.owner_id:
+            return
+
+        tb = TracebackException.from_exception(error)
+        fingerprint = hashlib.sha1(
+            repr((title, _chain(tb))).encode(), usedforsecurity=False
+        ).hexdigest()
+
+        try:
+            self._queue.put_nowait((fingerprint, title, "".join(tb.format())))
+        except asyncio.QueueFull:
+            logger.warning("Error report queue is full, dropping: %s", title)
+            return
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            digest: dict[str, tuple[str, str, int]] = {}
+
+            fingerprint, title, tb = await self._queue.get()
+            digest[fingerprint] = (title, tb, 1)
+
+            deadline = time.monotonic() + self.window
+            while (timeout := deadline - time.monotonic()) > 0:
+                try:
+                    async with asyncio.timeout(timeout):
+                        fingerprint, title, tb = await self._queue.get()
+                except TimeoutError:
+                    break
+                first_title, first_tb, count = digest.get(fingerprint, (title, tb, 0))
+                digest[fingerprint] = (first_title, first_tb, count + 1)
+
+            try:
+                await self._send(list(digest.values()))
+            except HTTPException:
+                logger.exception("Failed to send error digest to the owner")
+
+    async def send_to_owner(self, content: str, files: list[File]) -> None:
+        if self._dm_channel is None:
+            assert self.client.owner_id is not None
+            owner = self.client.get_user(
+                self.client.owner_id
+            ) or await self.client.fetch_user(self.client.owner_id)
+            self._dm_channel = owner.dm_channel or await owner.create_dm()
+
+        await self._dm_channel.send(content, files=files)
+
+    async def _send(self, reports: list[tuple[str, str, int]]) -> None:
+        for i in range(0, len(reports), 10):
+            lines = []
+            files = []
+            for n, (title, tb, count) in enumerate(reports[i : i + 10], i + 1):
+                times = f" ({count} times)" if count > 1 else ""
+                lines.append(f"{n}) {title} raised an exception{times}")
+                files.append(
+                    File(io.BytesIO(tb.encode()), filename=f"traceback_{n}.txt")
+                )
+            await self.send_to_owner("\n".join(lines), files)
+
+
+def _chain(
+    tb: TracebackException,
+) -> list[tuple[str, list[tuple[str, int | None, str]]]]:
+    # Command errors are all wrapped in the same discord.py exception, so the
+    # whole chain is needed to tell them apart
+    chain = []
+    current: TracebackException | None = tb
+    while current is not None:
+        frames = [(frame.filename, frame.lineno, frame.name) for frame in current.stack]
+        chain.append((current.exc_type_str, frames))
+        if current.__cause__ is not None:
+            current = current.__cause__
+        elif not current.__suppress_context__:
+            current = current.__context__
+        else:
+            current = None
+    return chain
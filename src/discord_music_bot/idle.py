@@ -0,0 +1,77 @@
+import asyncio
+import heapq
+import logging
+import time
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class IdleScheduler:
+    def __init__(
+        self, timeout: float, callback: Callable[[int], Coroutine[Any, Any, None]]
+    ) -> None:
+        self.timeout = timeout
+        self.callback = callback
+
+        self._deadlines: dict[int, float] = {}
+        self._heap: list[tuple[float, int]] = []
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._callbacks: set[asyncio.Task[None]] = set()
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._deadlines
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, key: int) -> None:
+        if key in self._deadlines:
+            return
+        deadline = time.monotonic() + self.timeout
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+        if self._heap[0][1] == key:
+            self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def cancel(self, key: int) -> None:
+        self._deadlines.pop(key, None)
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            # Cancelled keys are only dropped from the heap once they surface
+            while self._heap:
+                deadline, key = self._heap[0]
+                if self._deadlines.get(key) == deadline:
+                    break
+                heapq.heappop(self._heap)
+
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            deadline, key = self._heap[0]
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                try:
+                    async with asyncio.timeout(delay):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            del self._deadlines[key]
+            task = asyncio.create_task(self.callback(key))
+            self._callbacks.add(task)
+            task.add_done_callback(self._callback_done)
+
+    def _callback_done(self, task: asyncio.Task[None]) -> None:
+        self._callbacks.discard(task)
+        if not task.cancelled() and (exc := task.exception()):
+            logger.error("Idle callback failed", exc_info=exc)
@@ -0,0 +1,110 @@
+import asyncio
+import contextlib
+from collections import Counter
+from collections.abc import AsyncIterator
+from functools import partial
+
+from wavelink import Node, Playable, Pool, Search, TrackSource
+
+from discord_music_bot.cache import SearchCache
+from discord_music_bot.metrics import Metrics
+
+
+class LoaderBusyError(Exception):
+    pass
+
+
+class TrackLoader:
+    def __init__(
+        self,
+        cache: SearchCache,
+        metrics: Metrics,
+        *,
+        max_concurrency: int = 8,
+        max_pending: int = 64,
+        queue_timeout: float = 2.5,
+    ) -> None:
+        self.cache = cache
+        self.metrics = metrics
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+
+        self._inflight: dict[tuple[str, SearchCache], asyncio.Task[Search]] = {}
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._pending: Counter[str] = Counter()
+
+    async def search(
+        self,
+        query: str,
+        *,
+        node: Node | None = None,
+        cache: SearchCache | None = None,
+    ) -> Search:
+        query = query.strip()
+        if cache is None:
+            cache = self.cache
+
+        results = cache.get(query)
+        if results is not None:
+            return results
+
+        key = (query, cache)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(
+                self._load(query, node or Pool.get_node(), cache)
+            )
+            task.add_done_callback(partial(self._load_done, key))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, query: str, node: Node, cache: SearchCache) -> Search:
+        with self.metrics.lavalink_rest.time(operation="search", node=node.identifier):
+            async with self.slot(node):
+                results = await Playable.search(
+                    query, source=TrackSource.YouTube, node=node
+                )
+        cache.put(query, results)
+        return results
+
+    async def decode(self, encoded: list[str], *, node: Node) -> list[Playable]:
+        if not encoded:
+            return []
+        with self.metrics.lavalink_rest.time(operation="decode", node=node.identifier):
+            async with self.slot(node, wait=True):
+                data = await node.send("POST", path="v4/decodetracks", data=encoded)
+        return [Playable(track) for track in data]
+
+    def _load_done(
+        self, key: tuple[str, SearchCache], task: asyncio.Task[Search]
+    ) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, node: Node, *, wait: bool = False) -> AsyncIterator[None]:
+        key = node.identifier
+        if not wait and self._pending[key] >= self.max_concurrency + self.max_pending:
+            raise LoaderBusyError
+
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[key] = semaphore
+
+        self._pending[key] += 1
+        try:
+            try:
+                async with asyncio.timeout(None if wait else self.queue_timeout):
+                    await semaphore.acquire()
+            except TimeoutError:
+                raise LoaderBusyError from None
+            try:
+                yield
+            finally:
+                semaphore.release()
+        finally:
+            self._pending[key] -= 1
@@ -0,0 +1,39 @@
+from discord import Guild, Member, StageChannel, VoiceChannel
+
+
+class MemberCachePolicy:
+    # discord.py caches every member sitting in any voice channel. In lean mode
+    # only the ones sharing a channel with one of our players are kept, and
+    # for the rest we just remember whether they're a bot, which is all the
+    # listener count needs.
+
+    def __init__(self, *, lean: bool = False) -> None:
+        self.lean = lean
+        self.evicted = 0
+
+        self._bots: set[int] = set()
+
+    def is_bot(self, guild: Guild, user_id: int) -> bool:
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member.bot
+        return user_id in self._bots
+
+    def evict(self, member: Member, keep: VoiceChannel | StageChannel | None) -> None:
+        if not self.lean or member.id == member.guild.me.id:
+            return
+        if keep is not None and member.voice and member.voice.channel == keep:
+            return
+        if member.guild.get_member(member.id) is None:
+            return
+
+        if member.bot:
+            self._bots.add(member.id)
+        member.guild._remove_member(member)
+        self.evicted += 1
+
+    def sweep(self, guild: Guild, keep: VoiceChannel | StageChannel | None) -> None:
+        if not self.lean:
+            return
+        for member in guild.members:
+            self.evict(member, keep)
@@ -0,0 +1,171 @@
+import asyncio
+import contextlib
+import logging
+import math
+import resource
+import time
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+Labels = tuple[tuple[str, str], ...]
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf)
+
+
+class Histogram:
+    def __init__(
+        self, name: str, documentation: str, buckets: tuple[float, ...] = BUCKETS
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+
+        # Per label set: one count per bucket, followed by the sum
+        self._series: dict[Labels, list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 1)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for key, series in self._series.items():
+            cumulative: float = 0
+            for bound, count in zip(self.buckets, series, strict=False):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else str(bound)
+                labels = _labels((*key, ("le", le)))
+                yield f"{self.name}_bucket{labels} {_value(cumulative)}"
+            yield f"{self.name}_sum{_labels(key)} {_value(series[-1])}"
+            yield f"{self.name}_count{_labels(key)} {_value(cumulative)}"
+
+
+class Metrics:
+    def __init__(self, *, lag_interval: float = 0.5) -> None:
+        self.lag_interval = lag_interval
+
+        self.command_latency = Histogram(
+            "bot_command_duration_seconds",
+            "Time from interaction creation to command completion.",
+        )
+        self.play_phase = Histogram(
+            "bot_play_phase_duration_seconds", "Time spent in each phase of /play."
+        )
+        self.lavalink_rest = Histogram(
+            "bot_lavalink_request_duration_seconds",
+            "Lavalink REST request latency, including queueing for a slot.",
+        )
+        self.track_transition = Histogram(
+            "bot_track_transition_seconds",
+            "Gap between a track ending and the next one starting.",
+        )
+        self.loop_lag = Histogram(
+            "bot_event_loop_lag_seconds",
+            "How late the event loop wakes up from a sleep.",
+            (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, math.inf),
+        )
+
+        self._collectors: dict[
+            str, tuple[str, str, Callable[[], Iterable[tuple[float, Labels]]]]
+        ] = {}
+        self._runner: web.AppRunner | None = None
+        self._lag_task: asyncio.Task[None] | None = None
+
+    def collector(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], Iterable[tuple[float, Labels]]],
+        *,
+        kind: str = "gauge",
+    ) -> None:
+        self._collectors[name] = (kind, documentation, collect)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for histogram in (
+            self.command_latency,
+            self.play_phase,
+            self.lavalink_rest,
+            self.track_transition,
+            self.loop_lag,
+        ):
+            lines.extend(histogram.render())
+        for name, (kind, documentation, collect) in self._collectors.items():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(
+                f"{name}{_labels(key)} {_value(value)}" for value, key in collect()
+            )
+        lines.append("")
+        return "\n".join(lines)
+
+    async def start(self, host: str, port: int) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self._lag_task = asyncio.create_task(self._measure_lag())
+        logger.info("Serving metrics on http://%s:%s/metrics", host, port)
+
+    async def stop(self) -> None:
+        if self._lag_task:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:  # noqa: ARG002
+        return web.Response(text=self.render(), content_type="text/plain")
+
+    async def _measure_lag(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            lag = time.perf_counter() - start - self.lag_interval
+            self.loop_lag.observe(max(lag, 0))
+
+
+def resident_memory() -> int:
+    with Path("/proc/self/statm").open() as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return f"{{{pairs}}}"
+
+
+def _value(value: float) -> str:
+    # Not :g, which keeps 6 significant digits and stalls large counters
+    if isinstance(value, int):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,177 @@
+import asyncio
+import contextlib
+import logging
+import time
+from typing import NamedTuple
+
+from discord import Client
+from wavelink import (
+    InvalidNodeException,
+    LavalinkException,
+    Node,
+    NodeException,
+    NodeReadyEventPayload,
+    NodeStatus,
+    Player,
+    Pool,
+    StatsResponsePayload,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class NodeConfig(NamedTuple):
+    identifier: str
+    host: str
+    port: int
+    password: str
+    region: str | None = None
+
+
+class NodeBalancer:
+    def __init__(
+        self,
+        configs: list[NodeConfig],
+        *,
+        region_penalty: float = 200,
+        stats_interval: float = 30,
+        health_interval: float = 5,
+        failover_after: float = 10,
+    ) -> None:
+        self.configs = configs
+        self.region_penalty = region_penalty
+        self.stats_interval = stats_interval
+        self.health_interval = health_interval
+        self.failover_after = failover_after
+
+        self.stats: dict[str, StatsResponsePayload] = {}
+        self._players_at_poll: dict[str, int] = {}
+        self._regions = {config.identifier: config.region for config in configs}
+        self._moved_players: dict[str, set[int]] = {}
+        self._down_since: dict[str, float] = {}
+        self._tasks: list[asyncio.Task[None]] = []
+
+    async def connect(self, client: Client) -> None:
+        nodes = [
+            Node(
+                identifier=config.identifier,
+                uri=f"http://{config.host}:{config.port}",
+                password=config.password,
+            )
+            for config in self.configs
+            if config.identifier not in Pool.nodes
+        ]
+        if nodes:
+            await Pool.connect(client=client, nodes=nodes)
+
+        if not self._tasks:
+            self._tasks.append(asyncio.create_task(self._poll_stats()))
+            self._tasks.append(asyncio.create_task(self._check_health()))
+
+    async def _poll_stats(self) -> None:
+        while True:
+            nodes = self.connected_nodes()
+            results = await asyncio.gather(
+                *(node.fetch_stats() for node in nodes), return_exceptions=True
+            )
+            for node, result in zip(nodes, results, strict=True):
+                if isinstance(result, StatsResponsePayload):
+                    self.stats[node.identifier] = result
+                    self._players_at_poll[node.identifier] = len(node.players)
+                else:
+                    self.stats.pop(node.identifier, None)
+            await asyncio.sleep(self.stats_interval)
+
+    async def _check_health(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            now = time.monotonic()
+            for node in Pool.nodes.values():
+                if node.status is NodeStatus.CONNECTED:
+                    self._down_since.pop(node.identifier, None)
+                    continue
+                # Give the node a chance to reconnect and resume its session
+                # before moving everything off it
+                down_since = self._down_since.setdefault(node.identifier, now)
+                if now - down_since < self.failover_after:
+                    continue
+                for player in list(node.players.values()):
+                    try:
+                        target = self.best_node(player.channel.rtc_region)
+                    except InvalidNodeException:
+                        break
+                    await self.move_player(player, target)
+
+    async def node_ready(self, payload: NodeReadyEventPayload) -> None:
+        node = payload.node
+        self._down_since.pop(node.identifier, None)
+
+        if payload.resumed:
+            # Lavalink kept its session, so anything still attached to it is
+            # fine; players we moved away in the meantime must be dropped
+            for guild_id in self._moved_players.pop(node.identifier, set()):
+                if node.get_player(guild_id) is None:
+                    with contextlib.suppress(LavalinkException, NodeException):
+                        await node._destroy_player(guild_id)
+            return
+
+        self._moved_players.pop(node.identifier, None)
+        for player in list(node.players.values()):
+            await self.move_player(player, node)
+
+    async def move_player(self, player: Player, node: Node) -> None:
+        assert player.guild is not None
+        guild_id = player.guild.id
+        old_node = player.node
+        track = player.current
+        position = player._last_position
+
+        old_node._players.pop(guild_id, None)
+        if old_node is not node:
+            self._moved_players.setdefault(old_node.identifier, set()).add(guild_id)
+        player._node = node
+        node._players[guild_id] = player
+
+        try:
+            await player._dispatch_voice_update()
+            if track and player.connected:
+                await player.play(
+                    track, start=position, paused=player.paused, add_history=False
+                )
+        except (LavalinkException, NodeException):
+            logger.exception("Failed to move player for guild %s to %r", guild_id, node)
+        else:
+            logger.info("Moved player for guild %s to %r", guild_id, node)
+
+    def penalty(self, node: Node, region: str | None = None) -> float:
+        stats = self.stats.get(node.identifier)
+        if stats is None:
+            penalty = float(len(node.players))
+        else:
+            # Players placed since the last poll aren't reflected in the stats yet
+            players_delta = len(node.players) - self._players_at_poll[node.identifier]
+            penalty = stats.playing + max(players_delta, 0)
+            penalty += 1.05 ** (100 * stats.cpu.system_load) * 10 - 10
+            if stats.frames:
+                deficit = stats.frames.deficit / 3000
+                nulled = stats.frames.nulled / 3000
+                penalty += 1.03 ** (500 * deficit) * 600 - 600
+                penalty += (1.03 ** (500 * nulled) * 300 - 300) * 2
+
+        node_region = self._regions.get(node.identifier)
+        if region and node_region and node_region != region:
+            penalty += self.region_penalty
+
+        return penalty
+
+    def connected_nodes(self) -> list[Node]:
+        return [
+            node for node in Pool.nodes.values() if node.status is NodeStatus.CONNECTED
+        ]
+
+    def best_node(self, region: str | None = None) -> Node:
+        nodes = self.connected_nodes()
+        if not nodes:
+            msg = "No Lavalink nodes are currently connected."
+            raise InvalidNodeException(msg)
+        return min(nodes, key=lambda node: self.penalty(node, region))
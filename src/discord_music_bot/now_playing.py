@@ -0,0 +1,98 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+from discord import (
+    Embed,
+    HTTPException,
+    Message,
+    NotFound,
+    TextChannel,
+    Thread,
+    VoiceChannel,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class NowPlayingMessage:
+    def __init__(self, *, delay: float = 1, rate: int = 5, per: float = 5) -> None:
+        self.delay = delay
+        self.rate = rate
+        self.per = per
+
+        self.message: Message | None = None
+        self._channel: TextChannel | VoiceChannel | Thread | None = None
+        self._embed: Embed | None = None
+        self._pending = False
+        self._task: asyncio.Task[None] | None = None
+
+        self._tokens = float(rate)
+        self._refilled_at = time.monotonic()
+
+    def update(
+        self, channel: TextChannel | VoiceChannel | Thread | None, embed: Embed | None
+    ) -> None:
+        self._channel = channel
+        self._embed = embed
+        self._pending = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._pending = False
+        if self.message:
+            with contextlib.suppress(NotFound):
+                await self.message.delete()
+            self.message = None
+
+    async def _run(self) -> None:
+        await asyncio.sleep(self.delay)
+        while self._pending:
+            await self._acquire()
+            self._pending = False
+            try:
+                await self._apply(self._channel, self._embed)
+            except HTTPException:
+                logger.warning(
+                    "Failed to update the now playing message", exc_info=True
+                )
+
+    async def _apply(
+        self, channel: TextChannel | VoiceChannel | Thread | None, embed: Embed | None
+    ) -> None:
+        if self.message and (
+            embed is None or channel is None or self.message.channel.id != channel.id
+        ):
+            with contextlib.suppress(NotFound):
+                await self.message.delete()
+            self.message = None
+
+        if embed is None or channel is None:
+            return
+
+        if self.message:
+            try:
+                self.message = await self.message.edit(embed=embed)
+            except NotFound:
+                self.message = None
+            else:
+                return
+
+        self.message = await channel.send(embed=embed)
+
+    async def _acquire(self) -> None:
+        now = time.monotonic()
+        refill = (now - self._refilled_at) * self.rate / self.per
+        self._tokens = min(self.rate, self._tokens + refill)
+        self._refilled_at = now
+
+        if self._tokens < 1:
+            await asyncio.sleep((1 - self._tokens) * self.per / self.rate)
+            self._tokens = 1
+            self._refilled_at = time.monotonic()
+        self._tokens -= 1
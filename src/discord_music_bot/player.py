@@ -1,35 +1,394 @@
+import asyncio
+import contextlib
+import logging
+import time
 from collections import deque
-from typing import Any
+from collections.abc import Iterable
+from typing import Any, Literal, NamedTuple, cast
 
-from discord import Client, Message, NotFound, TextChannel, Thread, VoiceChannel
+from discord import Client, StageChannel, TextChannel, Thread, VoiceChannel
 from discord.abc import Connectable
-from wavelink import Playable, Player
+from discord.types.voice import GuildVoiceState as GuildVoiceStatePayload
+from wavelink import LavalinkException, NodeException, Playable, Player
+
+from discord_music_bot.bot import MyBot
+from discord_music_bot.now_playing import NowPlayingMessage
+from discord_music_bot.queue_pages import QueuePages
+from discord_music_bot.store import PlayerState
+from discord_music_bot.track_queue import QueueEntry, TrackQueue
+
+logger = logging.getLogger(__name__)
+
+MessageKind = Literal["skip", "stop", "start", "track_end"]
+
+
+class _Message(NamedTuple):
+    kind: MessageKind
+    # The track a skip is aimed at, or the one that ended
+    track: Playable | QueueEntry | None
+    reason: str
+    # Resolves to whether the message took effect
+    done: asyncio.Future[bool]
 
 
 class MyPlayer(Player):
     def __init__(self, client: Client, channel: Connectable) -> None:
-        super().__init__(client, channel)
+        region = None
+        if isinstance(channel, VoiceChannel | StageChannel):
+            region = channel.rtc_region
+        node = cast(MyBot, client).node_balancer.best_node(region)
+        super().__init__(client, channel, nodes=[node])
 
-        self.play_queue: deque[Playable] = deque()
+        self.play_queue = TrackQueue()
+        self.queue_pages = QueuePages(self.play_queue)
         self.loop: bool | Playable = False
         self.text_channel: TextChannel | VoiceChannel | Thread | None = None
-        self.now_playing_message: Message | None = None
+        self.now_playing = NowPlayingMessage()
+        self.listeners = 0
+        self.warm = False
+        self.transition_gaps: deque[float] = deque(maxlen=100)
+        self._play_next_lock = asyncio.Lock()
+        self._preload: tuple[QueueEntry, asyncio.Future[Playable]] | None = None
+        self._track_ended_at: float | None = None
+        self._mailbox: deque[_Message] = deque()
+        self._actor: asyncio.Task[None] | None = None
+        self._pending_skips = 0
+        # Taken off the queue, but not playing yet
+        self._landing: QueueEntry | None = None
+        self._resume_on_wake = False
 
-    async def skip(self, *, force: bool = True) -> None:
-        if isinstance(self.loop, Playable):
+    async def park(self) -> None:
+        if self.warm or not self.guild:
+            return
+        # Nobody is listening, but someone may be back soon: stay connected
+        # and paused for a while, so a quick /play doesn't have to reconnect
+        self.warm = True
+        self._resume_on_wake = self.playing and not self.paused
+        if self._resume_on_wake:
+            await self.pause(True)
+        cast(MyBot, self.client).warm_scheduler.schedule(self.guild.id)
+
+    async def wake(self, channel: VoiceChannel | StageChannel) -> None:
+        if not self.warm or not self.guild:
+            return
+        self.warm = False
+        cast(MyBot, self.client).warm_scheduler.cancel(self.guild.id)
+        if channel != self.channel:
+            await self.move_to(channel)
+        if self._resume_on_wake:
+            await self.pause(False)
+
+    async def skip_track(
+        self, expected: Playable | None = None
+    ) -> Playable | QueueEntry | None:
+        # Skips queued before this one will have moved past the tracks ahead
+        # of it by the time it runs. Queued skips haven't touched the queue
+        # yet, and the one being applied has already taken its track off it.
+        target: Playable | QueueEntry | None = self._landing or self.current
+        if self._pending_skips:
             try:
-                self.loop = self.play_queue.popleft()
+                target = self.play_queue[self._pending_skips - 1]
             except IndexError:
+                target = None
+        if target is None:
+            return None
+        if expected is not None and target.encoded != expected.encoded:
+            return None
+
+        self._pending_skips += 1
+        skipped = await self._send("skip", target)
+        return target if skipped else None
+
+    async def clear(self) -> None:
+        await self._send("stop")
+
+    async def start(self) -> None:
+        await self._send("start")
+
+    async def track_ended(self, track: Playable, reason: str) -> None:
+        await self._send("track_end", track, reason)
+
+    def _send(
+        self,
+        kind: MessageKind,
+        track: Playable | QueueEntry | None = None,
+        reason: str = "",
+    ) -> asyncio.Future[bool]:
+        done = asyncio.get_running_loop().create_future()
+        self._mailbox.append(_Message(kind, track, reason, done))
+        if self._actor is None or self._actor.done():
+            self._actor = asyncio.create_task(self._run())
+        return done
+
+    async def _run(self) -> None:
+        while self._mailbox:
+            messages = [self._mailbox.popleft()]
+            kind = messages[0].kind
+            if kind in ("skip", "start"):
+                while self._mailbox and self._mailbox[0].kind == kind:
+                    messages.append(self._mailbox.popleft())
+
+            try:
+                match kind:
+                    case "skip":
+                        self._pending_skips -= len(messages)
+                        applied = await self._jump(
+                            [message.track for message in messages]
+                        )
+                        _resolve(
+                            (
+                                message
+                                for message, ok in zip(messages, applied, strict=True)
+                                if not ok
+                            ),
+                            result=False,
+                        )
+                    case "stop":
+                        await self._stop()
+                    case "start":
+                        if not self.playing:
+                            await self.play_next()
+                    case "track_end":
+                        if messages[0].reason != "replaced":
+                            assert isinstance(messages[0].track, Playable)
+                            await self.advance(messages[0].track)
+            except asyncio.CancelledError:
+                _resolve(messages, result=False)
+                raise
+            except Exception as e:
+                _resolve(messages, e)
+            else:
+                _resolve(messages)
+
+    async def _jump(self, targets: list[Playable | QueueEntry | None]) -> list[bool]:
+        # Skips aimed at tracks that already ended on their own, or that were
+        # removed or moved since the skip was sent, are dropped. Returns which
+        # ones were applied.
+        current = self.current
+        encoded = [target.encoded if target else None for target in targets]
+        if current is None or current.encoded not in encoded:
+            return [False] * len(targets)
+        stale = encoded.index(current.encoded)
+        applied = [False] * stale
+
+        # Replay the skips against the queue, then make a single call to
+        # Lavalink for wherever they ended up
+        finished: Playable | QueueEntry = current
+        upcoming: QueueEntry | None = None
+        for target in encoded[stale:]:
+            if target != finished.encoded:
+                break
+            applied.append(True)
+            if self.loop is True:
+                self.play_queue.append(finished)
+            if not self.play_queue:
+                upcoming = None
+                break
+            upcoming = finished = self.play_queue.popleft()
+        applied += [False] * (len(targets) - len(applied))
+
+        if upcoming is None:
+            if isinstance(self.loop, Playable):
                 self.loop = False
-        await super().skip(force=force)
+            await self.skip(force=True)
+            return applied
+
+        self._landing = upcoming
+        try:
+            track = await self._take(upcoming)
+            if isinstance(self.loop, Playable):
+                self.loop = track
+            self._track_ended_at = time.perf_counter()
+            await self.play(track)
+        finally:
+            self._landing = None
+        return applied
+
+    async def _stop(self) -> None:
+        self.play_queue.clear()
+        self.loop = False
+        if self.current:
+            await self.skip(force=True)
 
     async def disconnect(self, **kwargs: Any) -> None:
-        await self.delete_now_playing_message()
+        self.forget()
+        if self._actor:
+            self._actor.cancel()
+        _resolve(self._mailbox, result=False)
+        self._mailbox.clear()
+        self._pending_skips = 0
+        self._landing = None
+        guild = self.guild
+        if guild:
+            cast(MyBot, self.client).idle_scheduler.cancel(guild.id)
+            cast(MyBot, self.client).warm_scheduler.cancel(guild.id)
+        await self.now_playing.close()
         await super().disconnect(**kwargs)
+        if guild:
+            cast(MyBot, self.client).member_cache.sweep(guild, None)
+
+    async def on_voice_state_update(self, data: GuildVoiceStatePayload, /) -> None:
+        if not data["channel_id"]:
+            self.forget()
+        await super().on_voice_state_update(data)
+
+    def count_listeners(self, channel: VoiceChannel | StageChannel) -> None:
+        # Voice states are always cached, the members behind them may not be
+        member_cache = cast(MyBot, self.client).member_cache
+        self.listeners = sum(
+            not member_cache.is_bot(channel.guild, user_id)
+            for user_id in channel.voice_states
+        )
+        self.update_idle()
+
+    def update_idle(self) -> None:
+        if not self.guild:
+            return
+        idle_scheduler = cast(MyBot, self.client).idle_scheduler
+        if self.listeners > 0:
+            idle_scheduler.cancel(self.guild.id)
+        else:
+            idle_scheduler.schedule(self.guild.id)
 
-    async def delete_now_playing_message(self) -> None:
-        if self.now_playing_message:
+    def save(self) -> None:
+        if self.guild:
+            cast(MyBot, self.client).player_store.save(self.guild.id, self.snapshot)
+
+    def forget(self) -> None:
+        if self.guild:
+            cast(MyBot, self.client).player_store.delete(self.guild.id)
+
+    def snapshot(self) -> PlayerState:
+        assert self.guild is not None
+        return PlayerState(
+            guild_id=self.guild.id,
+            channel_id=self.channel.id,
+            text_channel_id=self.text_channel.id if self.text_channel else None,
+            current=self.current.encoded if self.current else None,
+            position=self.position,
+            loop_track=self.loop.encoded if isinstance(self.loop, Playable) else None,
+            loop_queue=self.loop is True,
+            queue={entry.seq: entry.encoded for entry in self.play_queue},
+        )
+
+    async def restore(self, state: PlayerState) -> None:
+        assert self.guild is not None
+        bot = cast(MyBot, self.client)
+
+        text_channel = self.guild.get_channel_or_thread(state.text_channel_id or 0)
+        if isinstance(text_channel, TextChannel | VoiceChannel | Thread):
+            self.text_channel = text_channel
+
+        head = [encoded for encoded in (state.current, state.loop_track) if encoded]
+        tracks = await bot.track_loader.decode(
+            [*head, *state.queue.values()], node=self.node
+        )
+        decoded = dict(zip(head, tracks, strict=False))
+        self.play_queue.extend(tracks[len(head) :])
+
+        current = decoded.get(state.current or "")
+        if state.loop_track:
+            self.loop = decoded[state.loop_track]
+        elif state.loop_queue:
+            self.loop = True
+
+        if current:
+            await self.play(current, start=state.position)
+        else:
+            await self.play_next()
+
+    async def resolve(self, entry: QueueEntry) -> Playable:
+        bot = cast(MyBot, self.client)
+        [track] = await bot.track_loader.decode([entry.encoded], node=self.node)
+        return track
+
+    def enqueue(self, tracks: list[Playable]) -> None:
+        head = not self.play_queue
+        self.play_queue.extend(tracks)
+        if not head or not tracks:
+            return
+
+        # The first track is up next and was just searched for, so there's
+        # no need to decode it again
+        if self._preload:
+            self._preload[1].cancel()
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(tracks[0])
+        self._preload = (self.play_queue[0], future)
+
+    def preload(self) -> None:
+        try:
+            entry = self.play_queue[0]
+        except IndexError:
+            return
+        if self._preload:
+            if self._preload[0] is entry:
+                return
+            self._preload[1].cancel()
+
+        task = asyncio.create_task(self.resolve(entry))
+        task.add_done_callback(_consume_exception)
+        self._preload = (entry, task)
+
+    async def _take(self, entry: QueueEntry) -> Playable:
+        preload, self._preload = self._preload, None
+        if preload and preload[0] is entry:
+            with contextlib.suppress(LavalinkException, NodeException):
+                return await preload[1]
+        elif preload:
+            preload[1].cancel()
+        return await self.resolve(entry)
+
+    async def play_next(self) -> None:
+        async with self._play_next_lock:
+            if self.playing:
+                return
+            try:
+                entry = self.play_queue.popleft()
+            except IndexError:
+                return
+            self._landing = entry
             try:
-                await self.now_playing_message.delete()
-            except NotFound:
-                pass
+                await self.play(await self._take(entry))
+            finally:
+                self._landing = None
+
+    async def advance(self, finished: Playable) -> None:
+        self._track_ended_at = time.perf_counter()
+        if isinstance(self.loop, Playable):
+            await self.play(self.loop)
+        elif self.loop and not self.play_queue:
+            await self.play(finished)
+        else:
+            if self.loop:
+                self.play_queue.append(finished)
+            await self.play_next()
+
+    def track_started(self) -> None:
+        if self._track_ended_at is not None:
+            gap = time.perf_counter() - self._track_ended_at
+            self._track_ended_at = None
+            self.transition_gaps.append(gap)
+            cast(MyBot, self.client).metrics.track_transition.observe(gap)
+            logger.debug("Track transition in guild %s took %.3fs", self.guild, gap)
+        self.preload()
+
+
+def _resolve(
+    messages: Iterable[_Message],
+    error: Exception | None = None,
+    *,
+    result: bool = True,
+) -> None:
+    for message in messages:
+        if message.done.done():
+            continue
+        if error:
+            message.done.set_exception(error)
+        else:
+            message.done.set_result(result)
+
+
+def _consume_exception(future: asyncio.Future[Playable]) -> None:
+    if not future.cancelled():
+        future.exception()
@@ -0,0 +1,129 @@
+import io
+import time
+
+from discord import File, Interaction, Permissions
+from discord.app_commands import (
+    Choice,
+    Group,
+    Range,
+    check,
+    default_permissions,
+    describe,
+)
+
+from discord_music_bot.bot import MyBot
+from discord_music_bot.profiling import dump_tasks
+
+
+async def is_owner(interaction: Interaction[MyBot]) -> bool:
+    return await interaction.client.is_owner(interaction.user)
+
+
+def _file(text: str, filename: str) -> File:
+    return File(io.BytesIO(text.encode()), filename=filename)
+
+
+async def setup(bot: MyBot) -> None:
+    # Hidden from everyone but administrators, and only usable by the owner
+    profile = Group(
+        name="profile",
+        description="Profile the bot's event loop.",
+        default_permissions=Permissions.none(),
+    )
+
+    @profile.command(description="Start sampling the event loop for a while.")
+    @describe(
+        seconds="How long to profile for.",
+        interval="Milliseconds between samples.",
+        slow_callback="Report callbacks blocking the loop for longer than this, "
+        "in milliseconds.",
+    )
+    @check(is_owner)
+    async def start(
+        interaction: Interaction[MyBot],
+        seconds: Range[int, 1, 600] = 30,
+        interval: Range[int, 1, 1000] = 5,
+        slow_callback: Range[int, 1, 10_000] = 100,
+    ) -> None:
+        profiler = interaction.client.profiler
+        if profiler.running:
+            await interaction.response.send_message(
+                "A profile is already running.", ephemeral=True
+            )
+            return
+
+        await interaction.response.send_message(
+            f"Profiling for {seconds}s, the results will be sent to you.",
+            ephemeral=True,
+        )
+        report = await profiler.run(
+            seconds, interval=interval / 1000, slow_callback=slow_callback / 1000
+        )
+        await interaction.client.error_reporter.send_to_owner(
+            f"Profile of {report.duration:.1f}s, {report.samples} samples",
+            [
+                _file(report.summary, "profile_summary.txt"),
+                _file(report.stacks, "profile_stacks.txt"),
+                _file(report.slow_callbacks, "slow_callbacks.txt"),
+                _file(report.tasks, "tasks.txt"),
+            ],
+        )
+
+    @profile.command(description="Stop the running profile early.")
+    @check(is_owner)
+    async def stop(interaction: Interaction[MyBot]) -> None:
+        if interaction.client.profiler.stop():
+            await interaction.response.send_message("Profile stopped.", ephemeral=True)
+        else:
+            await interaction.response.send_message(
+                "No profile is running.", ephemeral=True
+            )
+
+    @profile.command(description="Dump the stacks of all the running asyncio tasks.")
+    @check(is_owner)
+    async def tasks(interaction: Interaction[MyBot]) -> None:
+        await interaction.response.send_message(
+            "The task dump will be sent to you.", ephemeral=True
+        )
+        await interaction.client.error_reporter.send_to_owner(
+            f"Task dump at <t:{int(time.time())}:T>", [_file(dump_tasks(), "tasks.txt")]
+        )
+
+    bot.tree.add_command(profile)
+
+    @bot.tree.command(description="Reload a plugin in place.")
+    @default_permissions()
+    @check(is_owner)
+    async def reload(interaction: Interaction[MyBot], plugin: str) -> None:
+        if interaction.client.shard_ids is not None:
+            # Only this cluster's process would pick up the new code
+            await interaction.response.send_message(
+                "Plugins can't be reloaded when running in clusters, "
+                "restart them instead.",
+                ephemeral=True,
+            )
+            return
+
+        await interaction.response.defer(ephemeral=True)
+
+        start = time.perf_counter()
+        held = await interaction.client.reload_plugin(plugin)
+        elapsed = (time.perf_counter() - start) * 1000
+        await interaction.followup.send(
+            f"Reloaded `{plugin}` in {elapsed:.0f}ms, {held} events were held back."
+        )
+
+    @reload.autocomplete("plugin")
+    async def reload_autocomplete(
+        interaction: Interaction[MyBot], current: str
+    ) -> list[Choice[str]]:
+        plugins = (
+            name.rpartition(".")[2]
+            for name in interaction.client.extensions
+            if name.startswith("discord_music_bot.plugins.")
+        )
+        return [
+            Choice(name=plugin, value=plugin)
+            for plugin in sorted(plugins)
+            if current.casefold() in plugin
+        ]
@@ -1,105 +1,368 @@
 import asyncio
-from typing import cast
+import contextlib
+import logging
+from collections.abc import Awaitable, Callable, Coroutine
+from typing import Any, TypeVar, cast
 
 from discord import (
+    ButtonStyle,
+    ClientException,
     Embed,
     Guild,
+    HTTPException,
     Interaction,
     Member,
+    StageChannel,
     TextChannel,
+    TextStyle,
     Thread,
     VoiceChannel,
     VoiceState,
+    WebhookMessage,
 )
-from discord.app_commands import guild_only
+from discord.app_commands import Choice, guild_only
 from discord.app_commands.checks import bot_has_permissions
+from discord.ui import Button, Modal, TextInput, View, button
 from discord.utils import escape_markdown
 from wavelink import (
     InvalidNodeException,
     LavalinkLoadException,
+    Node,
+    NodeReadyEventPayload,
     Playable,
+    PlayerUpdateEventPayload,
     Playlist,
+    Search,
     TrackEndEventPayload,
-    TrackSource,
     TrackStartEventPayload,
+    WavelinkException,
     WebsocketClosedEventPayload,
 )
 
 from discord_music_bot.bot import MyBot
+from discord_music_bot.loader import LoaderBusyError
+from discord_music_bot.metrics import Labels
 from discord_music_bot.player import MyPlayer
+from discord_music_bot.track_queue import QueueEntry
 
+logger = logging.getLogger(__name__)
 
-async def setup(bot: MyBot) -> None:
-    @bot.tree.command(description="Play a track from YouTube.")
-    @guild_only()
-    @bot_has_permissions(view_channel=True, send_messages=True)
-    async def play(interaction: Interaction[MyBot], song: str) -> None:
-        await interaction.response.defer()
+T = TypeVar("T")
 
-        guild = cast(Guild, interaction.guild)
-        channel = cast(TextChannel | VoiceChannel | Thread, interaction.channel)
-        user = cast(Member, interaction.user)
-        player = cast(MyPlayer | None, guild.voice_client)
+MAX_QUERIES = 25
+MAX_PARALLEL_SEARCHES = 4
+MAX_FAILURES_SHOWN = 5
+MAX_RESTORE_ATTEMPTS = 3
+RESTORE_RETRY_DELAY = 30
+EMBED_LIMIT = 6000
 
-        if not player:
-            if user.voice and user.voice.channel:
-                try:
-                    player = await user.voice.channel.connect(
-                        cls=MyPlayer, self_deaf=True
-                    )
-                except (IndexError, InvalidNodeException):
-                    await interaction.followup.send(
-                        "Connection to Lavalink not yet established."
-                    )
-                    return
-            else:
-                await interaction.followup.send("You're not in a voice channel.")
-                return
 
-        if not user.voice:
-            await interaction.followup.send("You're not in a voice channel.")
-            return
+class PlayManyModal(Modal, title="Play tracks"):
+    songs: TextInput["PlayManyModal"] = TextInput(
+        label="Songs or URLs, one per line",
+        style=TextStyle.paragraph,
+        max_length=4000,
+    )
 
-        if user.voice.channel != player.channel:
-            await interaction.followup.send("We're not in the same voice channel.")
+    def __init__(
+        self, callback: Callable[[Interaction[MyBot], str], Awaitable[None]]
+    ) -> None:
+        super().__init__()
+        self.callback = callback
+
+    async def on_submit(self, interaction: Interaction[MyBot], /) -> None:  # type: ignore[override]
+        await self.callback(interaction, self.songs.value)
+
+    async def on_error(  # type: ignore[override]
+        self, interaction: Interaction[MyBot], error: Exception, /
+    ) -> None:
+        interaction.client.error_reporter.report("Modal `playmany`", error)
+
+        if interaction.response.is_done():
+            await interaction.followup.send(str(error), ephemeral=True)
+        else:
+            await interaction.response.send_message(str(error), ephemeral=True)
+
+
+class QueueView(View):
+    def __init__(
+        self, player: MyPlayer, render: Callable[[MyPlayer, int], Embed]
+    ) -> None:
+        super().__init__(timeout=180)
+        self.player = player
+        self.render = render
+        self.page = 0
+        self.message: WebhookMessage | None = None
+
+    def render_page(self, page: int) -> Embed:
+        self.page = max(0, min(page, len(self.player.queue_pages) - 1))
+        self.previous.disabled = self.page == 0
+        self.next.disabled = self.page == len(self.player.queue_pages) - 1
+        return self.render(self.player, self.page)
+
+    @button(label="Previous", style=ButtonStyle.secondary)
+    async def previous(
+        self,
+        interaction: Interaction[MyBot],
+        button: Button["QueueView"],  # noqa: ARG002
+    ) -> None:
+        await self._turn(interaction, self.page - 1)
+
+    @button(label="Next", style=ButtonStyle.secondary)
+    async def next(
+        self,
+        interaction: Interaction[MyBot],
+        button: Button["QueueView"],  # noqa: ARG002
+    ) -> None:
+        await self._turn(interaction, self.page + 1)
+
+    async def _turn(self, interaction: Interaction[MyBot], page: int) -> None:
+        if not self.player.connected or not self.player.current:
+            self.stop()
+            await interaction.response.edit_message(
+                content="The track queue is currently empty.", embed=None, view=None
+            )
             return
+        await interaction.response.edit_message(embed=self.render_page(page), view=self)
 
-        player.text_channel = channel
+    async def on_timeout(self) -> None:
+        if self.message:
+            with contextlib.suppress(HTTPException):
+                await self.message.edit(view=None)
+
+
+async def setup(bot: MyBot) -> None:
+    restore_limit = asyncio.Semaphore(4)
+    restore_attempts: dict[int, int] = {}
+
+    def queued_tracks() -> list[tuple[float, Labels]]:
+        players = (p for p in bot.voice_clients if isinstance(p, MyPlayer))
+        return [(sum(len(player.play_queue) for player in players), ())]
+
+    bot.metrics.collector(
+        "bot_queued_tracks", "Tracks waiting in player queues.", queued_tracks
+    )
+
+    @bot.tree.command(description="Play a track from YouTube.")
+    @guild_only()
+    @bot_has_permissions(view_channel=True, send_messages=True)
+    async def play(interaction: Interaction[MyBot], song: str) -> None:
+        phase = interaction.client.metrics.play_phase.time
+        with phase(phase="defer"):
+            await interaction.response.defer()
+
+        async def search(node: Node) -> Search:
+            with phase(phase="search"):
+                return await interaction.client.track_loader.search(song, node=node)
 
         try:
-            results = await Playable.search(song, source=TrackSource.YouTube)
+            joined = await _join(interaction, search)
         except LavalinkLoadException:
             await interaction.followup.send("Failed to load track, please try again.")
             return
+        except LoaderBusyError:
+            await interaction.followup.send("Lavalink is busy, please try again.")
+            return
+        if not joined:
+            return
+
+        player, results = joined
         if not results:
             await interaction.followup.send("No results found.")
             return
 
         if isinstance(results, Playlist):
-            player.play_queue.extend(results.tracks)
+            player.enqueue(results.tracks)
 
             embed = Embed(
                 title="Playlist enqueued", description=escape_markdown(results.name)
             )
-            for i, track in enumerate(results.tracks, 1):
-                if i > 25:
-                    break
-                track_link = _track_link(track)
-                embed.add_field(name="", value=f"{i}) {track_link}", inline=False)
-            if len(results.tracks) > 25:
-                embed.set_footer(text=f"... and {len(results.tracks) - 25} more.")
+            _add_track_fields(embed, results.tracks)
 
         else:
             track = results[0]
-            player.play_queue.append(track)
+            player.enqueue([track])
 
             track_link = _track_link(track)
             embed = Embed(title="Track enqueued", description=track_link)
 
-        await interaction.followup.send(embed=embed)
+        with phase(phase="respond"):
+            await interaction.followup.send(embed=embed)
+
+        await _start(interaction, player)
+
+    @play.autocomplete("song")
+    async def play_autocomplete(
+        interaction: Interaction[MyBot], current: str
+    ) -> list[Choice[str]]:
+        guild = cast(Guild, interaction.guild)
+        player = cast(MyPlayer | None, guild.voice_client)
+        suggestions = await interaction.client.search_suggester.suggest(
+            interaction.user.id, current, node=player.node if player else None
+        )
+        return [Choice(name=name, value=value) for name, value in suggestions]
+
+    @bot.tree.command(description="Play several tracks from YouTube at once.")
+    @guild_only()
+    @bot_has_permissions(view_channel=True, send_messages=True)
+    async def playmany(interaction: Interaction[MyBot]) -> None:
+        await interaction.response.send_modal(PlayManyModal(_play_many))
+
+    async def _play_many(interaction: Interaction[MyBot], text: str) -> None:
+        phase = interaction.client.metrics.play_phase.time
+        with phase(phase="defer"):
+            # A modal submit would otherwise be deferred as a message update
+            await interaction.response.defer(thinking=True)
+
+        queries = [line.strip() for line in text.splitlines() if line.strip()]
+        if not queries:
+            await interaction.followup.send("No songs specified.")
+            return
+        if len(queries) > MAX_QUERIES:
+            await interaction.followup.send(
+                f"You can add up to {MAX_QUERIES} songs at once."
+            )
+            return
+
+        limit = asyncio.Semaphore(MAX_PARALLEL_SEARCHES)
+        loader = interaction.client.track_loader
+
+        async def resolve(query: str, node: Node) -> list[Playable] | str:
+            async with limit:
+                try:
+                    results = await loader.search(query, node=node)
+                except LavalinkLoadException:
+                    return "failed to load"
+                except LoaderBusyError:
+                    return "Lavalink is busy"
+            if not results:
+                return "no results"
+            if isinstance(results, Playlist):
+                return results.tracks
+            return [results[0]]
+
+        async def resolve_all(node: Node) -> list[list[Playable] | str]:
+            with phase(phase="search"):
+                return await asyncio.gather(
+                    *(resolve(query, node) for query in queries)
+                )
+
+        joined = await _join(interaction, resolve_all)
+        if not joined:
+            return
+
+        player, resolved = joined
+
+        tracks = [
+            track for result in resolved if isinstance(result, list) for track in result
+        ]
+        failed = [
+            (query, result)
+            for query, result in zip(queries, resolved, strict=True)
+            if isinstance(result, str)
+        ]
+        if not tracks:
+            await interaction.followup.send(
+                f"No tracks could be added.\n{_failures(failed)}"
+            )
+            return
+
+        player.enqueue(tracks)
+
+        description = (
+            f"{len(tracks)} tracks from {len(queries) - len(failed)} "
+            f"of {len(queries)} songs."
+        )
+        if failed:
+            description += f"\n\nNot added:\n{_failures(failed)}"
+        embed = Embed(title="Tracks enqueued", description=description)
+        _add_track_fields(embed, tracks)
+
+        with phase(phase="respond"):
+            await interaction.followup.send(embed=embed)
+
+        await _start(interaction, player)
+
+    async def _join(
+        interaction: Interaction[MyBot],
+        search: Callable[[Node], Coroutine[Any, Any, T]],
+    ) -> tuple[MyPlayer, T] | None:
+        guild = cast(Guild, interaction.guild)
+        channel = cast(TextChannel | VoiceChannel | Thread, interaction.channel)
+        user = cast(Member, interaction.user)
+        player = cast(MyPlayer | None, guild.voice_client)
+
+        if not user.voice or not user.voice.channel:
+            await interaction.followup.send("You're not in a voice channel.")
+            return None
+        voice_channel = user.voice.channel
+
+        if player:
+            # A warm player follows the user, there's nobody else listening
+            await player.wake(voice_channel)
+            if voice_channel != player.channel:
+                await interaction.followup.send("We're not in the same voice channel.")
+                return None
+            result = await search(player.node)
+        else:
+            try:
+                player, result = await _connect(voice_channel, search)
+            except (IndexError, InvalidNodeException):
+                await interaction.followup.send(
+                    "Connection to Lavalink not yet established."
+                )
+                return None
+
+        player.text_channel = channel
+        return player, result
 
+    async def _connect(
+        channel: VoiceChannel | StageChannel,
+        search: Callable[[Node], Coroutine[Any, Any, T]],
+    ) -> tuple[MyPlayer, T]:
+        # The voice handshake and the search don't depend on each other, so
+        # search on the node the player is about to be assigned to meanwhile
+        node = bot.node_balancer.best_node(channel.rtc_region)
+
+        async def connect() -> MyPlayer:
+            try:
+                with bot.metrics.play_phase.time(phase="connect"):
+                    return await channel.connect(cls=MyPlayer, self_deaf=True)
+            except ClientException:
+                # Someone else connected first, that player isn't ours to clean up
+                raise
+            except BaseException:
+                # discord.py only cleans up after a timeout, not after a
+                # cancellation or a failure on the Lavalink side
+                if channel.guild.voice_client:
+                    await channel.guild.voice_client.disconnect(force=True)
+                raise
+
+        async def search_or_error() -> T | Exception:
+            # A failed search keeps the connection, users are told to try again
+            try:
+                return await search(node)
+            except Exception as e:
+                return e
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                connecting = tg.create_task(connect())
+                searching = tg.create_task(search_or_error())
+        except BaseExceptionGroup as group:
+            raise group.exceptions[0] from None
+
+        player, result = connecting.result(), searching.result()
+        if isinstance(result, Exception):
+            raise result
+        return player, result
+
+    async def _start(interaction: Interaction[MyBot], player: MyPlayer) -> None:
         if not player.playing:
-            await player.play(player.play_queue.popleft())
+            with interaction.client.metrics.play_phase.time(phase="start"):
+                await player.start()
+        player.preload()
+        player.save()
 
     @bot.tree.command(description="Seek the current track.")
     @guild_only()
@@ -175,6 +438,7 @@ async def setup(bot: MyBot) -> None:
         else:
             player.loop = player.current
             await interaction.followup.send("Track looping enabled.")
+        player.save()
 
     @bot.tree.command(description="Loop the current queue.")
     @guild_only()
@@ -204,6 +468,7 @@ async def setup(bot: MyBot) -> None:
         else:
             player.loop = True
             await interaction.followup.send("Queue looping enabled.")
+        player.save()
 
     @bot.tree.command(description="Skip to the next track.")
     @guild_only()
@@ -237,16 +502,20 @@ async def setup(bot: MyBot) -> None:
             return
 
         if clear:
-            player.play_queue.clear()
-        skipped_track = player.current
-        await player.stop()
-
-        if clear:
+            await player.clear()
+            player.save()
             await interaction.followup.send("Queue cleared.")
-        else:
-            track_link = _track_link(skipped_track)
-            embed = Embed(title="Track skipped", description=track_link)
-            await interaction.followup.send(embed=embed)
+            return
+
+        skipped_track = await player.skip_track()
+        if skipped_track is None:
+            await interaction.followup.send("There is nothing left to skip.")
+            return
+        player.save()
+
+        track_link = _track_link(skipped_track)
+        embed = Embed(title="Track skipped", description=track_link)
+        await interaction.followup.send(embed=embed)
 
     @bot.tree.command(description="Remove a track from the queue.")
     @guild_only()
@@ -260,6 +529,36 @@ async def setup(bot: MyBot) -> None:
     async def bump(interaction: Interaction[MyBot], song: str) -> None:
         await _remove_or_bump(interaction, song, bump=True)
 
+    @remove.autocomplete("song")
+    async def remove_autocomplete(
+        interaction: Interaction[MyBot], current: str
+    ) -> list[Choice[str]]:
+        return _queue_choices(interaction, current, include_current=True)
+
+    @bump.autocomplete("song")
+    async def bump_autocomplete(
+        interaction: Interaction[MyBot], current: str
+    ) -> list[Choice[str]]:
+        return _queue_choices(interaction, current, include_current=False)
+
+    def _queue_choices(
+        interaction: Interaction[MyBot], current: str, *, include_current: bool
+    ) -> list[Choice[str]]:
+        guild = cast(Guild, interaction.guild)
+        player = cast(MyPlayer | None, guild.voice_client)
+        if not player or not player.current:
+            return []
+
+        titles = []
+        if include_current and current.casefold() in player.current.title.casefold():
+            titles.append(player.current.title)
+        titles.extend(
+            entry.title
+            for entry in player.play_queue.find_all(current, 25 - len(titles))
+        )
+        # Values are matched as substrings, so a cut off title still finds it
+        return [Choice(name=title[:100], value=title[:100]) for title in titles]
+
     async def _remove_or_bump(
         interaction: Interaction[MyBot], song: str, *, bump: bool
     ) -> None:
@@ -284,30 +583,37 @@ async def setup(bot: MyBot) -> None:
         song = song.casefold()
 
         if not bump and song in player.current.title.casefold():
-            skipped_track = player.current
-            await player.stop()
+            # Only if it's still the track the queued skips will land on
+            skipped_track = await player.skip_track(player.current)
+            if skipped_track is None:
+                await interaction.followup.send("The track was not found in the queue.")
+                return
+            player.save()
             track_link = _track_link(skipped_track)
             embed = Embed(title="Track skipped", description=track_link)
             await interaction.followup.send(embed=embed)
             return
 
-        for track in player.play_queue:
-            if song in track.title.casefold():
-                player.play_queue.remove(track)
-                if bump:
-                    player.play_queue.appendleft(track)
-                track_link = _track_link(track)
-                if bump:
-                    embed = Embed(
-                        title="Track moved to the top of the queue",
-                        description=track_link,
-                    )
-                else:
-                    embed = Embed(title="Track removed", description=track_link)
-                await interaction.followup.send(embed=embed)
-                return
+        entry = player.play_queue.find(song)
+        if entry is None:
+            await interaction.followup.send("The track was not found in the queue.")
+            return
 
-        await interaction.followup.send("The track was not found in the queue.")
+        if bump:
+            player.play_queue.move_to_front(entry)
+        else:
+            player.play_queue.remove(entry)
+        player.preload()
+        player.save()
+
+        track_link = _track_link(entry)
+        if bump:
+            embed = Embed(
+                title="Track moved to the top of the queue", description=track_link
+            )
+        else:
+            embed = Embed(title="Track removed", description=track_link)
+        await interaction.followup.send(embed=embed)
 
     @bot.tree.command(description="Show the current queue.")
     @guild_only()
@@ -322,6 +628,17 @@ async def setup(bot: MyBot) -> None:
             await interaction.followup.send("The track queue is currently empty.")
             return
 
+        if len(player.queue_pages) == 1:
+            await interaction.followup.send(embed=_queue_embed(player, 0))
+            return
+
+        view = QueueView(player, _queue_embed)
+        view.message = await interaction.followup.send(
+            embed=view.render_page(0), view=view, wait=True
+        )
+
+    def _queue_embed(player: MyPlayer, page: int) -> Embed:
+        assert player.current is not None
         track_link = _track_link(player.current)
         position = int(20 / player.current.length * player.position)
         progress_bar_before = "-" * position
@@ -336,15 +653,14 @@ async def setup(bot: MyBot) -> None:
             f"{timestamp_current} {progress_bar} {timestamp_total}"
         )
         embed = Embed(title="Song queue", description=description)
-        for i, track in enumerate(player.play_queue, 1):
-            if i > 25:
-                break
-            track_link = _track_link(track)
-            embed.add_field(name="", value=f"{i}) {track_link}", inline=False)
-        if len(player.play_queue) > 25:
-            embed.set_footer(text=f"... and {len(player.play_queue) - 25} more.")
-
-        await interaction.followup.send(embed=embed)
+        for line in player.queue_pages.get(page, _track_link):
+            embed.add_field(name="", value=line, inline=False)
+        pages = len(player.queue_pages)
+        if pages > 1:
+            embed.set_footer(
+                text=f"Page {page + 1}/{pages}, {len(player.play_queue)} tracks"
+            )
+        return embed
 
     @bot.tree.command(description="Disconnect from the voice channel.")
     @guild_only()
@@ -374,27 +690,63 @@ async def setup(bot: MyBot) -> None:
 
     @bot.listen()
     async def on_voice_state_update(
+        member: Member, before: VoiceState, after: VoiceState
+    ) -> None:
+        if before.channel == after.channel:
+            return
+        player = cast(MyPlayer | None, member.guild.voice_client)
+        if not player:
+            return
+
+        if member == bot.user:
+            if after.channel:
+                player.count_listeners(after.channel)
+            return
+        if member.bot:
+            return
+
+        if before.channel == player.channel:
+            player.listeners -= 1
+        if after.channel == player.channel:
+            player.listeners += 1
+        player.update_idle()
+        if player.listeners > 0:
+            await player.wake(player.channel)
+
+    @bot.listen()
+    async def on_player_idle(guild: Guild) -> None:
+        player = cast(MyPlayer | None, guild.voice_client)
+        if not player:
+            return
+        if bot.warm_scheduler.timeout > 0:
+            await player.park()
+        else:
+            await player.disconnect(force=False)
+
+    @bot.listen("on_voice_state_update")
+    async def evict_member(
         member: Member,
         before: VoiceState,  # noqa: ARG001
         after: VoiceState,  # noqa: ARG001
     ) -> None:
         player = cast(MyPlayer | None, member.guild.voice_client)
-        if not player:
-            return
-        voice_channel = player.channel
-        if all(x.bot for x in voice_channel.members):
-            await asyncio.sleep(15)
-            if all(x.bot for x in voice_channel.members):
-                await player.disconnect()
+        bot.member_cache.evict(member, player.channel if player else None)
+
+    @bot.listen("on_guild_available")
+    @bot.listen("on_guild_join")
+    async def sweep_members(guild: Guild) -> None:
+        player = cast(MyPlayer | None, guild.voice_client)
+        bot.member_cache.sweep(guild, player.channel if player else None)
 
     @bot.listen()
     async def on_wavelink_track_start(payload: TrackStartEventPayload) -> None:
         player = cast(MyPlayer, payload.player)
+        player.track_started()
+        player.save()
 
-        if player.text_channel:
-            track_link = _track_link(payload.track)
-            embed = Embed(title="Now playing", description=track_link)
-            player.now_playing_message = await player.text_channel.send(embed=embed)
+        track_link = _track_link(payload.track)
+        embed = Embed(title="Now playing", description=track_link)
+        player.now_playing.update(player.text_channel, embed)
 
     @bot.listen()
     async def on_wavelink_track_end(payload: TrackEndEventPayload) -> None:
@@ -403,16 +755,74 @@ async def setup(bot: MyBot) -> None:
 
         player = cast(MyPlayer, payload.player)
 
-        await player.delete_now_playing_message()
-        if isinstance(player.loop, Playable):
-            await player.play(player.loop)
-        else:
-            if player.loop:
-                player.play_queue.append(payload.track)
+        await player.track_ended(payload.track, payload.reason)
+        player.save()
+
+        if not player.playing:
+            player.now_playing.update(player.text_channel, None)
+
+    @bot.listen()
+    async def on_wavelink_player_update(payload: PlayerUpdateEventPayload) -> None:
+        if payload.player is None or payload.player.guild is None:
+            return
+
+        bot.player_store.save_position(payload.player.guild.id, payload.position)
+
+    @bot.listen()
+    async def on_wavelink_node_ready(
+        payload: NodeReadyEventPayload,  # noqa: ARG001
+    ) -> None:
+        for guild_id in list(bot.pending_restores):
+            guild = bot.get_guild(guild_id)
+            if guild:
+                bot.dispatch("player_restore", guild)
+
+    @bot.listen()
+    async def on_guild_available(guild: Guild) -> None:
+        if guild.id in bot.pending_restores and bot.node_balancer.connected_nodes():
+            bot.dispatch("player_restore", guild)
+
+    @bot.listen()
+    async def on_player_restore(guild: Guild) -> None:
+        async with restore_limit:
+            state = bot.pending_restores.pop(guild.id, None)
+            if state is None or guild.voice_client:
+                return
+
+            channel = guild.get_channel(state.channel_id)
+            if not isinstance(channel, VoiceChannel | StageChannel):
+                bot.player_store.delete(guild.id)
+                return
+
             try:
-                await player.play(player.play_queue.popleft())
-            except IndexError:
-                pass
+                player = await channel.connect(cls=MyPlayer, self_deaf=True)
+                await player.restore(state)
+            except (TimeoutError, WavelinkException):
+                # discord.py only cleans up after its own timeout
+                if guild.voice_client:
+                    await guild.voice_client.disconnect(force=True)
+
+                attempts = restore_attempts.pop(guild.id, 0) + 1
+                if attempts >= MAX_RESTORE_ATTEMPTS:
+                    logger.exception("Giving up restoring the player in %s", guild)
+                    bot.player_store.delete(guild.id)
+                    return
+
+                logger.warning(
+                    "Failed to restore the player in %s, retrying in %ss",
+                    guild,
+                    RESTORE_RETRY_DELAY,
+                    exc_info=True,
+                )
+                restore_attempts[guild.id] = attempts
+                # Disconnecting forgot the saved state, it's still needed
+                bot.player_store.save(guild.id, lambda: state)
+                bot.pending_restores[guild.id] = state
+                asyncio.get_running_loop().call_later(
+                    RESTORE_RETRY_DELAY, bot.dispatch, "player_restore", guild
+                )
+            else:
+                restore_attempts.pop(guild.id, None)
 
     @bot.listen()
     async def on_wavelink_websocket_closed(
@@ -423,7 +833,7 @@ async def setup(bot: MyBot) -> None:
 
         player = cast(MyPlayer, payload.player)
 
-        await player.delete_now_playing_message()
+        await player.now_playing.close()
 
     def _timestamp(milliseconds: int | float, show_hours: bool | None = None) -> str:
         parts = []
@@ -435,7 +845,33 @@ async def setup(bot: MyBot) -> None:
         parts.append(f"{seconds:0>2}")
         return ":".join(parts)
 
-    def _track_link(track: Playable) -> str:
+    def _add_track_fields(embed: Embed, tracks: list[Playable]) -> None:
+        # Long titles can hit the limit on the whole embed before the one on
+        # the number of fields, keep some room for the footer
+        budget = EMBED_LIMIT - 100
+        shown = 0
+        for i, track in enumerate(tracks[:25], 1):
+            value = f"{i}) {_track_link(track)}"[:1024]
+            if len(embed) + len(value) > budget:
+                break
+            embed.add_field(name="", value=value, inline=False)
+            shown = i
+        if len(tracks) > shown:
+            embed.set_footer(text=f"... and {len(tracks) - shown} more.")
+
+    def _failures(failed: list[tuple[str, str]]) -> str:
+        lines = [
+            f"{escape_markdown(_truncate(query, 100))}: {reason}"
+            for query, reason in failed[:MAX_FAILURES_SHOWN]
+        ]
+        if len(failed) > MAX_FAILURES_SHOWN:
+            lines.append(f"... and {len(failed) - MAX_FAILURES_SHOWN} more.")
+        return "\n".join(lines)
+
+    def _truncate(text: str, length: int) -> str:
+        return text if len(text) <= length else f"{text[: length - 1]}…"
+
+    def _track_link(track: Playable | QueueEntry) -> str:
         track_title = escape_markdown(track.title)
         if not track.uri:
             return track_title
@@ -0,0 +1,190 @@
+import asyncio
+import contextlib
+import io
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType
+from typing import NamedTuple
+
+
+class ProfileReport(NamedTuple):
+    duration: float
+    samples: int
+    summary: str
+    stacks: str
+    tasks: str
+    slow_callbacks: str
+
+
+class _LogCapture(logging.Handler):
+    def __init__(self, limit: int) -> None:
+        super().__init__(logging.WARNING)
+        self.limit = limit
+        self.lines: list[str] = []
+        self.dropped = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if len(self.lines) >= self.limit:
+            self.dropped += 1
+            return
+        self.lines.append(f"{record.created:.3f} {record.getMessage()}")
+
+
+class Profiler:
+    def __init__(self, *, max_slow_callbacks: int = 1000, top: int = 25) -> None:
+        self.max_slow_callbacks = max_slow_callbacks
+        self.top = top
+
+        self._stacks: Counter[tuple[str, ...]] = Counter()
+        self._labels: dict[CodeType, str] = {}
+        self._stopped: asyncio.Event | None = None
+        self._sampler: threading.Thread | None = None
+        self._sampling = threading.Event()
+        self._capture: _LogCapture | None = None
+        self._loop_debug = (False, 0.1)
+
+    @property
+    def running(self) -> bool:
+        return self._stopped is not None
+
+    async def run(
+        self, duration: float, *, interval: float, slow_callback: float
+    ) -> ProfileReport:
+        if self._stopped is not None:
+            msg = "A profile is already running"
+            raise RuntimeError(msg)
+
+        stopped = self._stopped = asyncio.Event()
+        start = time.perf_counter()
+        self._start(interval, slow_callback)
+        try:
+            with contextlib.suppress(TimeoutError):
+                async with asyncio.timeout(duration):
+                    await stopped.wait()
+        finally:
+            self._finish()
+            self._stopped = None
+
+        return self._report(time.perf_counter() - start)
+
+    def stop(self) -> bool:
+        if self._stopped is None:
+            return False
+        self._stopped.set()
+        return True
+
+    def _start(self, interval: float, slow_callback: float) -> None:
+        self._stacks.clear()
+
+        # The loop logs every callback that blocks it for longer than
+        # slow_callback_duration, but only in debug mode
+        loop = asyncio.get_running_loop()
+        self._loop_debug = (loop.get_debug(), loop.slow_callback_duration)
+        self._capture = _LogCapture(self.max_slow_callbacks)
+        logging.getLogger("asyncio").addHandler(self._capture)
+        loop.slow_callback_duration = slow_callback
+        loop.set_debug(True)
+
+        self._sampling.clear()
+        self._sampler = threading.Thread(
+            target=self._sample,
+            args=(threading.get_ident(), interval),
+            name="profiler",
+            daemon=True,
+        )
+        self._sampler.start()
+
+    def _finish(self) -> None:
+        self._sampling.set()
+        if self._sampler:
+            self._sampler.join()
+            self._sampler = None
+
+        loop = asyncio.get_running_loop()
+        debug, loop.slow_callback_duration = self._loop_debug
+        loop.set_debug(debug)
+        if self._capture:
+            logging.getLogger("asyncio").removeHandler(self._capture)
+
+    def _sample(self, thread_id: int, interval: float) -> None:
+        while not self._sampling.wait(interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code, frame.f_globals))
+                frame = frame.f_back
+            if stack:
+                self._stacks[tuple(reversed(stack))] += 1
+
+    def _label(self, code: CodeType, f_globals: dict[str, object]) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            module = f_globals.get("__name__", code.co_filename)
+            label = self._labels[code] = f"{module}:{code.co_qualname}"
+        return label
+
+    def _report(self, duration: float) -> ProfileReport:
+        samples = self._stacks.total()
+        own: Counter[str] = Counter()
+        total: Counter[str] = Counter()
+        for stack, count in self._stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+
+        summary = [
+            f"{samples} samples over {duration:.1f}s",
+            "",
+            f"Top {self.top} by own samples:",
+            *_table(own, samples, self.top),
+            "",
+            f"Top {self.top} by total samples:",
+            *_table(total, samples, self.top),
+        ]
+
+        # Folded stacks, ready for flamegraph.pl or speedscope
+        stacks = "\n".join(
+            f"{';'.join(stack)} {count}" for stack, count in self._stacks.most_common()
+        )
+
+        slow_callbacks = "\n".join(self._capture.lines) if self._capture else ""
+        if self._capture and self._capture.dropped:
+            slow_callbacks += f"\n... and {self._capture.dropped} more"
+
+        return ProfileReport(
+            duration,
+            samples,
+            "\n".join(summary),
+            stacks,
+            dump_tasks(),
+            slow_callbacks or "No slow callbacks.",
+        )
+
+
+def dump_tasks() -> str:
+    tasks = sorted(asyncio.all_tasks(), key=lambda task: task.get_name())
+    coros = Counter(_coro_name(task) for task in tasks)
+
+    out = io.StringIO()
+    out.write(f"{len(tasks)} tasks\n\n")
+    for name, count in coros.most_common():
+        out.write(f"{count:6} {name}\n")
+    for task in tasks:
+        out.write("\n")
+        task.print_stack(file=out)
+    return out.getvalue()
+
+
+def _coro_name(task: "asyncio.Task[object]") -> str:
+    coro = task.get_coro()
+    return getattr(coro, "__qualname__", type(coro).__name__)
+
+
+def _table(counter: Counter[str], samples: int, top: int) -> list[str]:
+    return [
+        f"{count:8} {count / samples:7.1%}  {label}"
+        for label, count in counter.most_common(top)
+    ]
@@ -0,0 +1,39 @@
+from collections.abc import Callable
+
+from discord_music_bot.track_queue import QueueEntry, TrackQueue
+
+
+class QueuePages:
+    def __init__(self, queue: TrackQueue, *, page_size: int = 10) -> None:
+        self.queue = queue
+        self.page_size = page_size
+
+        self.renders = 0
+
+        self._pages: dict[int, tuple[int, list[str]]] = {}
+
+    def __len__(self) -> int:
+        return max(1, -(-len(self.queue) // self.page_size))
+
+    def get(self, page: int, link: Callable[[QueueEntry], str]) -> list[str]:
+        start = page * self.page_size
+        end = start + self.page_size
+
+        cached = self._pages.get(page)
+        if cached:
+            version, lines = cached
+            changed = self.queue.changed_since(version)
+            if changed is None or changed >= end:
+                # Still valid, restamp it so it outlives the queue's change log
+                self._pages[page] = (self.queue.version, lines)
+                return lines
+
+        lines = []
+        for index in range(start, min(end, len(self.queue))):
+            entry = self.queue[index]
+            if entry.link is None:
+                entry.link = link(entry)
+            lines.append(f"{index + 1}) {entry.link}")
+        self._pages[page] = (self.queue.version, lines)
+        self.renders += 1
+        return lines
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    guild_id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    text_channel_id INTEGER,
+    current TEXT,
+    position INTEGER NOT NULL,
+    loop_track TEXT,
+    loop_queue INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queue (
+    guild_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    encoded TEXT NOT NULL,
+    PRIMARY KEY (guild_id, seq)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class PlayerState(NamedTuple):
+    guild_id: int
+    channel_id: int
+    text_channel_id: int | None
+    current: str | None
+    position: int
+    loop_track: str | None
+    loop_queue: bool
+    # Encoded tracks by their sequence number, in queue order
+    queue: dict[int, str]
+
+
+class PlayerStore:
+    def __init__(self, path: Path, *, flush_interval: float = 2) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+
+        self._connection: sqlite3.Connection | None = None
+        self._dirty: dict[int, Callable[[], PlayerState] | None] = {}
+        self._positions: dict[int, int] = {}
+        # The queue rows in the database for each guild
+        self._written: dict[int, dict[int, str]] = {}
+        self._flush_task: asyncio.Task[None] | None = None
+        self._lock = threading.Lock()
+
+    async def open(self) -> dict[int, PlayerState]:
+        self._connection = await asyncio.to_thread(self._connect)
+        states = await asyncio.to_thread(self._load)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        return states
+
+    async def close(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._connection:
+            try:
+                await self.flush()
+            finally:
+                connection, self._connection = self._connection, None
+                await asyncio.to_thread(self._close, connection)
+
+    def save(self, guild_id: int, snapshot: Callable[[], PlayerState]) -> None:
+        if self._connection:
+            self._dirty[guild_id] = snapshot
+
+    def save_position(self, guild_id: int, position: int) -> None:
+        if self._connection:
+            self._positions[guild_id] = position
+
+    def delete(self, guild_id: int) -> None:
+        if self._connection:
+            self._dirty[guild_id] = None
+            self._positions.pop(guild_id, None)
+
+    async def get_meta(self, key: str) -> str | None:
+        return await asyncio.to_thread(self._get_meta, key)
+
+    async def set_meta(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self._set_meta, key, value)
+
+    async def flush(self) -> None:
+        if not self._dirty and not self._positions:
+            return
+
+        dirty, self._dirty = self._dirty, {}
+        positions, self._positions = self._positions, {}
+
+        states = [snapshot() for snapshot in dirty.values() if snapshot]
+        deletes = [guild_id for guild_id, snapshot in dirty.items() if not snapshot]
+        position_updates = [
+            (position, guild_id)
+            for guild_id, position in positions.items()
+            if guild_id not in dirty
+        ]
+
+        # Only the queue entries added or removed since the last write are
+        # touched, guilds without a previous write get theirs replaced
+        rewrites = [
+            state.guild_id for state in states if state.guild_id not in self._written
+        ]
+        inserts: list[tuple[int, int, str]] = []
+        removals: list[tuple[int, int]] = []
+        for state in states:
+            before = self._written.get(state.guild_id, {})
+            inserts.extend(
+                (state.guild_id, seq, encoded)
+                for seq, encoded in state.queue.items()
+                if before.get(seq) != encoded
+            )
+            removals.extend(
+                (state.guild_id, seq) for seq in before if seq not in state.queue
+            )
+
+        try:
+            await asyncio.to_thread(
+                self._write,
+                states,
+                deletes,
+                position_updates,
+                rewrites,
+                inserts,
+                removals,
+            )
+        except BaseException:
+            # Newer saves and deletes win over the failed ones
+            for guild_id, snapshot in dirty.items():
+                self._dirty.setdefault(guild_id, snapshot)
+            for guild_id, position in positions.items():
+                self._positions.setdefault(guild_id, position)
+            raise
+
+        self._written.update((state.guild_id, state.queue) for state in states)
+        for guild_id in deletes:
+            self._written.pop(guild_id, None)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except sqlite3.Error:
+                logger.exception("Failed to save player states, retrying later")
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        with connection:
+            _migrate(connection)
+        return connection
+
+    def _close(self, connection: sqlite3.Connection) -> None:
+        with self._lock:
+            connection.close()
+
+    def _load(self) -> dict[int, PlayerState]:
+        assert self._connection is not None
+        queues: dict[int, dict[int, str]] = {}
+        for guild_id, seq, encoded in self._connection.execute(
+            "SELECT guild_id, seq, encoded FROM queue ORDER BY guild_id, seq"
+        ):
+            queues.setdefault(guild_id, {})[seq] = encoded
+
+        rows = self._connection.execute(
+            "SELECT guild_id, channel_id, text_channel_id, current, position, "
+            "loop_track, loop_queue FROM players"
+        )
+        return {
+            row[0]: PlayerState._make((*row[:6], bool(row[6]), queues.get(row[0], {})))
+            for row in rows
+        }
+
+    def _get_meta(self, key: str) -> str | None:
+        assert self._connection is not None
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        return str(row[0]) if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        assert self._connection is not None
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value)
+            )
+
+    def _write(
+        self,
+        states: list[PlayerState],
+        deletes: list[int],
+        position_updates: list[tuple[int, int]],
+        rewrites: list[int],
+        inserts: list[tuple[int, int, str]],
+        removals: list[tuple[int, int]],
+    ) -> None:
+        assert self._connection is not None
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO players VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [state[:7] for state in states],
+            )
+            self._connection.executemany(
+                "DELETE FROM players WHERE guild_id = ?",
+                [(guild_id,) for guild_id in deletes],
+            )
+            self._connection.executemany(
+                "DELETE FROM queue WHERE guild_id = ?",
+                [(guild_id,) for guild_id in [*deletes, *rewrites]],
+            )
+            self._connection.executemany(
+                "DELETE FROM queue WHERE guild_id = ? AND seq = ?", removals
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO queue VALUES (?, ?, ?)", inserts
+            )
+            self._connection.executemany(
+                "UPDATE players SET position = ? WHERE guild_id = ?",
+                position_updates,
+            )
+
+
+def _migrate(connection: sqlite3.Connection) -> None:
+    # Queues used to be saved as a JSON array in the players table
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(players)")}
+    if "queue" not in columns:
+        return
+    rows = connection.execute("SELECT guild_id, queue FROM players").fetchall()
+    connection.executemany(
+        "INSERT OR REPLACE INTO queue VALUES (?, ?, ?)",
+        [
+            (guild_id, seq, encoded)
+            for guild_id, queue in rows
+            for seq, encoded in enumerate(json.loads(queue))
+        ],
+    )
+    connection.execute("ALTER TABLE players DROP COLUMN queue")
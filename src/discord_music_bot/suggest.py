@@ -0,0 +1,139 @@
+import asyncio
+import itertools
+import time
+from collections import Counter, OrderedDict
+from typing import NamedTuple
+
+from wavelink import LavalinkLoadException, Node, Playlist
+
+from discord_music_bot.cache import SearchCache
+from discord_music_bot.loader import LoaderBusyError, TrackLoader
+
+
+class Suggestion(NamedTuple):
+    name: str
+    value: str
+
+
+class SearchSuggester:
+    def __init__(
+        self,
+        loader: TrackLoader,
+        *,
+        debounce: float = 0.3,
+        budget: float = 1.5,
+        min_length: int = 3,
+        max_inflight: int = 4,
+        max_size: int = 512,
+        ttl: float = 10 * 60,
+        max_results: int = 10,
+    ) -> None:
+        self.loader = loader
+        self.debounce = debounce
+        self.budget = budget
+        self.min_length = min_length
+        self.max_inflight = max_inflight
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_results = max_results
+
+        self.outcomes: Counter[str] = Counter()
+
+        # Partial queries would only push real /play results out of the
+        # loader's cache
+        self._search_cache = SearchCache(max_size=max_size, ttl=ttl)
+
+        self._entries: OrderedDict[str, tuple[float, list[Suggestion]]] = OrderedDict()
+        self._keystrokes = itertools.count()
+        self._latest: dict[int, int] = {}
+        self._inflight = 0
+
+    async def suggest(
+        self, user_id: int, query: str, *, node: Node | None = None
+    ) -> list[Suggestion]:
+        query = query.strip()
+        key = query.casefold()
+        if len(key) < self.min_length or "://" in key:
+            self.outcomes["skipped"] += 1
+            return []
+
+        suggestions = self._get(key)
+        if suggestions is not None:
+            self.outcomes["cached"] += 1
+            return suggestions
+
+        # Only the last keystroke in a burst gets to search
+        keystroke = self._latest[user_id] = next(self._keystrokes)
+        await asyncio.sleep(self.debounce)
+        if self._latest.get(user_id) != keystroke:
+            self.outcomes["debounced"] += 1
+            return self._fallback(key)
+        del self._latest[user_id]
+
+        if self._inflight >= self.max_inflight:
+            self.outcomes["shed"] += 1
+            return self._fallback(key)
+
+        self._inflight += 1
+        try:
+            # The search itself keeps running past the budget, so asking again
+            # is served from the search cache
+            async with asyncio.timeout(self.budget - self.debounce):
+                results = await self.loader.search(
+                    query, node=node, cache=self._search_cache
+                )
+        except TimeoutError:
+            self.outcomes["timed_out"] += 1
+            return self._fallback(key)
+        except (LavalinkLoadException, LoaderBusyError):
+            self.outcomes["failed"] += 1
+            return self._fallback(key)
+        finally:
+            self._inflight -= 1
+
+        if isinstance(results, Playlist):
+            suggestions = [Suggestion(_truncate(results.name), query[:100])]
+        else:
+            suggestions = [
+                Suggestion(
+                    _truncate(f"{track.title} - {track.author}"),
+                    track.uri
+                    if track.uri and len(track.uri) <= 100
+                    else track.title[:100],
+                )
+                for track in results[: self.max_results]
+            ]
+        self._put(key, suggestions)
+        self.outcomes["searched"] += 1
+        return suggestions
+
+    def _get(self, key: str) -> list[Suggestion] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires, suggestions = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return suggestions
+
+    def _put(self, key: str, suggestions: list[Suggestion]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, suggestions)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _fallback(self, key: str) -> list[Suggestion]:
+        # Results for what the user had typed so far beat an empty list
+        for end in range(len(key) - 1, self.min_length - 1, -1):
+            suggestions = self._get(key[:end])
+            if suggestions is not None:
+                return suggestions
+        return []
+
+
+def _truncate(text: str) -> str:
+    return text if len(text) <= 100 else f"{text[:99]}…"
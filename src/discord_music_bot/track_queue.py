@@ -0,0 +1,234 @@
+import heapq
+from collections import deque
+from collections.abc import Iterable, Iterator
+from itertools import islice
+
+from wavelink import Playable
+
+
+class QueueEntry:
+    __slots__ = ("encoded", "key", "length", "link", "seq", "slot", "title", "uri")
+
+    def __init__(self, track: "Playable | QueueEntry") -> None:
+        self.encoded: str = track.encoded
+        self.title: str = track.title
+        self.uri: str | None = track.uri
+        self.length: int = track.length
+        self.key = self.title.casefold()
+        self.slot = -1
+        self.seq = 0
+        # Rendered markdown link, filled in the first time the entry is shown
+        self.link: str | None = None
+
+
+class TrackQueue:
+    # Entries live in a slot array with tombstones, and a Fenwick tree over the
+    # slots counts the live ones, so positional lookups and removals are
+    # O(log n). Titles are indexed by trigram for substring searches, but only
+    # once the queue is first searched, so unsearched queues stay small.
+    # Entries are also numbered in queue order, and keep their number for as
+    # long as they stay in place, so the queue can be saved incrementally.
+
+    def __init__(self, tracks: Iterable[Playable] = ()) -> None:
+        self._slots: list[QueueEntry | None] = []
+        self._tree: list[int] = [0]
+        self._front = 0
+        self._back = 0
+        self._size = 0
+        self._first_seq = 0
+        self._next_seq = 0
+        self._trigrams: dict[str, set[QueueEntry]] | None = None
+
+        # Every mutation bumps the version and logs the lowest index it
+        # touched, so views of the queue can tell what they need to redo
+        self.version = 0
+        self._changes: deque[tuple[int, int]] = deque(maxlen=64)
+
+        self.extend(tracks)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[QueueEntry]:
+        for entry in self._slots[self._front : self._back]:
+            if entry:
+                yield entry
+
+    def __getitem__(self, index: int) -> QueueEntry:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            msg = "queue index out of range"
+            raise IndexError(msg)
+        entry = self._slots[self._find(index)]
+        assert entry is not None
+        return entry
+
+    def append(self, track: Playable | QueueEntry) -> None:
+        self._append(track)
+        self._changed(self._size - 1)
+
+    def appendleft(self, track: Playable) -> None:
+        self._appendleft(QueueEntry(track))
+        self._changed(0)
+
+    def extend(self, tracks: Iterable[Playable]) -> None:
+        start = self._size
+        for track in tracks:
+            self._append(track)
+        if self._size > start:
+            self._changed(start)
+
+    def popleft(self) -> QueueEntry:
+        if not self._size:
+            msg = "pop from an empty queue"
+            raise IndexError(msg)
+        entry = self._slots[self._find(0)]
+        assert entry is not None
+        self.remove(entry)
+        return entry
+
+    def clear(self) -> None:
+        self._slots = []
+        self._tree = [0]
+        self._front = self._back = self._size = 0
+        self._trigrams = None
+        self._changed(0)
+
+    def index(self, entry: QueueEntry) -> int:
+        return self._prefix(entry.slot)
+
+    def remove(self, entry: QueueEntry) -> None:
+        self._changed(self.index(entry))
+        self._unplace(entry)
+        if self._back - self._front - self._size > self._size + 64:
+            self._rebuild()
+
+    def move_to_front(self, entry: QueueEntry) -> None:
+        self._unplace(entry)
+        self._appendleft(entry)
+        self._changed(0)
+
+    def changed_since(self, version: int) -> int | None:
+        if version == self.version:
+            return None
+        if not self._changes or self._changes[0][0] > version + 1:
+            # Older than the log, assume everything changed
+            return 0
+        return min(index for changed, index in self._changes if changed > version)
+
+    def find(self, query: str) -> QueueEntry | None:
+        matches = self.find_all(query, 1)
+        return matches[0] if matches else None
+
+    def find_all(self, query: str, limit: int) -> list[QueueEntry]:
+        query = query.casefold()
+        grams = _trigrams(query)
+        if not grams:
+            return list(islice((entry for entry in self if query in entry.key), limit))
+
+        if self._trigrams is None:
+            self._trigrams = {}
+            for entry in self:
+                self._index(entry)
+
+        candidates = [self._trigrams.get(gram) for gram in grams]
+        smallest = min(candidates, key=lambda c: len(c) if c else 0)
+        if not smallest:
+            return []
+        matches = (entry for entry in smallest if query in entry.key)
+        return heapq.nsmallest(limit, matches, key=lambda entry: entry.slot)
+
+    def _changed(self, index: int) -> None:
+        self.version += 1
+        self._changes.append((self.version, index))
+
+    def _append(self, track: Playable | QueueEntry) -> None:
+        if self._back == len(self._slots):
+            self._rebuild()
+        entry = QueueEntry(track)
+        entry.seq = self._next_seq
+        self._next_seq += 1
+        self._place(entry, self._back)
+        self._back += 1
+
+    def _appendleft(self, entry: QueueEntry) -> None:
+        if self._front == 0:
+            self._rebuild()
+        self._front -= 1
+        self._first_seq -= 1
+        entry.seq = self._first_seq
+        self._place(entry, self._front)
+
+    def _place(self, entry: QueueEntry, slot: int) -> None:
+        entry.slot = slot
+        self._slots[slot] = entry
+        self._add(slot, 1)
+        self._size += 1
+        if self._trigrams is not None:
+            self._index(entry)
+
+    def _unplace(self, entry: QueueEntry) -> None:
+        self._slots[entry.slot] = None
+        self._add(entry.slot, -1)
+        self._size -= 1
+        if self._trigrams is not None:
+            for gram in _trigrams(entry.key):
+                entries = self._trigrams[gram]
+                entries.discard(entry)
+                if not entries:
+                    del self._trigrams[gram]
+
+    def _index(self, entry: QueueEntry) -> None:
+        assert self._trigrams is not None
+        for gram in _trigrams(entry.key):
+            self._trigrams.setdefault(gram, set()).add(entry)
+
+    def _rebuild(self) -> None:
+        entries = list(self)
+        padding = max(16, len(entries) // 4)
+        capacity = 2 * (len(entries) + padding)
+
+        self._slots = [None] * capacity
+        for slot, entry in enumerate(entries, padding):
+            entry.slot = slot
+            self._slots[slot] = entry
+        self._front = padding
+        self._back = padding + len(entries)
+
+        self._tree = [0] * (capacity + 1)
+        for i in range(1, capacity + 1):
+            if self._slots[i - 1]:
+                self._tree[i] += 1
+            parent = i + (i & -i)
+            if parent <= capacity:
+                self._tree[parent] += self._tree[i]
+
+    def _add(self, slot: int, delta: int) -> None:
+        i = slot + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, slot: int) -> int:
+        total = 0
+        i = slot
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _find(self, index: int) -> int:
+        slot = 0
+        remaining = index + 1
+        step = 1 << ((len(self._tree) - 1).bit_length() - 1)
+        while step:
+            if slot + step < len(self._tree) and self._tree[slot + step] < remaining:
+                slot += step
+                remaining -= self._tree[slot]
+            step >>= 1
+        return slot
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
@@ -1,8 +1,6 @@
-import io
-from traceback import format_exception
-
-from discord import File, Interaction
+from discord import Interaction
 from discord.app_commands import AppCommandError, CommandTree
+from discord.utils import utcnow
 
 from discord_music_bot.bot import MyBot
 
@@ -11,13 +9,13 @@ class MyTree(CommandTree[MyBot]):
     async def on_error(
         self, interaction: Interaction[MyBot], error: AppCommandError, /
     ) -> None:
-        if not interaction.client.owner_id:
-            return
-        target = await interaction.client.fetch_user(interaction.client.owner_id)
         command = f"`{interaction.command.name}`" if interaction.command else "tree"
-        tb = format_exception(type(error), error, error.__traceback__)
-        file = File(io.BytesIO("".join(tb).encode()), filename="traceback.txt")
-        await target.send(f"Command {command} raised an exception", file=file)
+        if interaction.command:
+            latency = (utcnow() - interaction.created_at).total_seconds()
+            interaction.client.metrics.command_latency.observe(
+                latency, command=interaction.command.qualified_name, status="error"
+            )
+        interaction.client.error_reporter.report(f"Command {command}", error)
 
         if interaction.response.is_done():
             await interaction.followup.send(str(error), ephemeral=True)